@@ -4,6 +4,7 @@ import pyotp
 import requests
 from kiteconnect import KiteConnect
 from dotenv import load_dotenv
+from zerodha_client import save_access_token, load_access_token, get_kite, is_token_valid, KITE_BACKEND
 
 load_dotenv()
 
@@ -67,13 +68,32 @@ def get_access_token():
     print("Access token generated successfully.")
 
     # Step 5 — Save to file
-    with open("access_token.txt", "w") as f:
-        f.write(access_token)
+    save_access_token(access_token, USER_ID)
     print("Access token saved.")
 
     return access_token
 
 
+def auto_login_configured():
+    # Never log a real account in while running against the fake backend
+    return KITE_BACKEND != "fake" and all([API_KEY, API_SECRET, USER_ID, PASSWORD, TOTP_KEY])
+
+
+def ensure_kite():
+    """Return a ready client for the configured account.
+
+    Reuses today's saved token if Zerodha still accepts it, otherwise runs the
+    TOTP login once.
+    """
+    access_token = load_access_token(USER_ID)
+    if access_token:
+        kite = get_kite(access_token, USER_ID)
+        if is_token_valid(kite):
+            return kite
+        print("Saved access token expired. Logging in again.")
+    return get_kite(get_access_token(), USER_ID)
+
+
 if __name__ == "__main__":
     get_access_token()
     print("Login successful.")
\ No newline at end of file
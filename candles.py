@@ -0,0 +1,166 @@
+# candles.py
+from datetime import datetime
+import numpy as np
+import pytz
+
+from indicators import EMA_FAST, EMA_SLOW, ema_next
+
+IST = pytz.timezone("Asia/Kolkata")
+
+CANDLE_DTYPE = np.dtype([
+    ("ts",     "i8"),   # candle start, epoch seconds
+    ("open",   "f8"),
+    ("high",   "f8"),
+    ("low",    "f8"),
+    ("close",  "f8"),
+    ("volume", "f8"),
+    ("ema20",  "f8"),
+    ("ema50",  "f8"),
+])
+
+DEFAULT_CAPACITY = 512
+
+
+def to_ts(date):
+    return int(date.timestamp())
+
+
+class Candle:
+    """Read-only view of one bar inside a CandleBuffer (no copy)."""
+    __slots__ = ("_data", "_i")
+
+    def __init__(self, data, i):
+        self._data = data
+        self._i    = i
+
+    @property
+    def date(self):
+        return datetime.fromtimestamp(int(self._data["ts"][self._i]), IST)
+
+    @property
+    def ts(self):
+        return int(self._data["ts"][self._i])
+
+    @property
+    def open(self):
+        return float(self._data["open"][self._i])
+
+    @property
+    def high(self):
+        return float(self._data["high"][self._i])
+
+    @property
+    def low(self):
+        return float(self._data["low"][self._i])
+
+    @property
+    def close(self):
+        return float(self._data["close"][self._i])
+
+    @property
+    def volume(self):
+        return float(self._data["volume"][self._i])
+
+    def __repr__(self):
+        return f"Candle({self.date:%d-%m-%Y %H:%M}, close={self.close})"
+
+
+class CandleBuffer:
+    """Fixed-capacity candles for one instrument and timeframe.
+
+    Rows live in a preallocated structured array of twice the capacity; when
+    the end is reached the newest `capacity` rows are moved to the front. The
+    live window is therefore always contiguous, so field and tail slices are
+    views, and EMA20/EMA50 are updated per bar instead of recomputed per poll.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._data    = np.zeros(capacity * 2, dtype=CANDLE_DTYPE)
+        self._start   = 0
+        self._end     = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __getitem__(self, key):
+        # buf["close"] → zero-copy column view; buf[-1] → Candle view
+        if isinstance(key, str):
+            return self._data[key][self._start:self._end]
+        n = len(self)
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError(key)
+        return Candle(self._data, self._start + key)
+
+    def tail(self, n: int):
+        return self._data[max(self._start, self._end - n):self._end]
+
+    @property
+    def last_ts(self):
+        return int(self._data["ts"][self._end - 1]) if self._end > self._start else None
+
+    # ── Writes ──
+    def _write(self, i, ts, o, h, l, c, v):
+        if i > self._start:
+            prev = self._data[i - 1]
+            ema20 = ema_next(prev["ema20"], c, EMA_FAST)
+            ema50 = ema_next(prev["ema50"], c, EMA_SLOW)
+        else:
+            ema20 = ema50 = c
+        self._data[i] = (ts, o, h, l, c, v, ema20, ema50)
+
+    def upsert(self, ts, o, h, l, c, v=0.0):
+        """Append a new bar, or update the forming bar in place if `ts` matches it."""
+        last = self.last_ts
+        if last is not None and ts < last:
+            return False
+        if last is not None and ts == last:
+            self._write(self._end - 1, ts, o, h, l, c, v)
+            return False
+
+        if self._end == len(self._data):
+            keep = self.capacity - 1
+            self._data[:keep] = self._data[self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        self._write(self._end, ts, o, h, l, c, v)
+        self._end += 1
+        if self._end - self._start > self.capacity:
+            self._start = self._end - self.capacity
+        return True
+
+    def merge(self, candles):
+        """Fold a Kite historical_data list in; returns the number of new bars.
+
+        Only the tail at or after the current last bar is touched, so a poll
+        that returns days of history costs a few row writes.
+        """
+        last = self.last_ts
+        i = len(candles)
+        if last is None:
+            i = max(0, i - self.capacity)
+        else:
+            while i > 0 and to_ts(candles[i - 1]["date"]) >= last:
+                i -= 1
+
+        added = 0
+        for c in candles[i:]:
+            added += self.upsert(to_ts(c["date"]), c["open"], c["high"], c["low"], c["close"],
+                                 c.get("volume", 0.0))
+        return added
+
+
+class CandleStore:
+    """CandleBuffers keyed by (instrument_token, timeframe)."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._buffers = {}
+
+    def get(self, instrument_token, timeframe):
+        key = (instrument_token, timeframe)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = CandleBuffer(self.capacity)
+        return buf
@@ -1,15 +1,103 @@
+import os
+import time
+import threading
 from datetime import datetime, timedelta
 import pytz
 IST = pytz.timezone("Asia/Kolkata")
 
+# Market data is the same for every account, so runs share these caches and
+# each upstream call is made once per window, whoever asks first.
+CANDLE_TTL = float(os.getenv("CANDLE_TTL", "1.0"))
+LTP_TTL    = float(os.getenv("LTP_TTL", "0.5"))
+LTP_WATCH  = 10   # seconds an instrument stays in the batched LTP request after its last read
+
+
+class TTLCache:
+    """One fetch per key per `ttl` seconds.
+
+    While a key is being refreshed, readers get the previous value instead of
+    queueing behind another session's (possibly throttled) call; only a key
+    with no value yet makes them wait for the fetch.
+    """
+
+    def __init__(self, ttl):
+        self.ttl    = ttl
+        self._data  = {}
+        self._locks = {}
+        self._lock  = threading.Lock()
+
+    def get(self, key, fetch):
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        hit = self._data.get(key)
+        if hit is not None and time.monotonic() - hit[0] < self.ttl:
+            return hit[1]
+        if not key_lock.acquire(blocking=hit is None):
+            return hit[1]
+        try:
+            hit = self._data.get(key)
+            if hit is not None and time.monotonic() - hit[0] < self.ttl:
+                return hit[1]
+            value = fetch()
+            self._data[key] = (time.monotonic(), value)
+            return value
+        finally:
+            key_lock.release()
+
+_candles = TTLCache(CANDLE_TTL)
+
+_ltp          = {}   # "EXCH:SYMBOL" → (fetched_at, last_price)
+_watch        = {}   # "EXCH:SYMBOL" → last read
+_ltp_lock     = threading.Lock()   # guards the two dicts only, never held across a call
+_refresh_lock = threading.Lock()   # single flight: one batched ltp() call at a time
+
+
 def get_candles_zk(kite, instrument_token, timeframe="5minute", days=3):
-    to_dt = datetime.now(IST).replace(tzinfo=None)
-    from_dt = to_dt - timedelta(days=days)
-
-    candles = kite.historical_data(
-        instrument_token=instrument_token,
-        from_date=from_dt,
-        to_date=to_dt,
-        interval=timeframe
-    )
-    return candles
+    def fetch():
+        to_dt = datetime.now(IST).replace(tzinfo=None)
+        from_dt = to_dt - timedelta(days=days)
+
+        return kite.historical_data(
+            instrument_token=instrument_token,
+            from_date=from_dt,
+            to_date=to_dt,
+            interval=timeframe
+        )
+    return _candles.get((instrument_token, timeframe, days), fetch)
+
+
+def get_ltp(kite, exchange, symbol):
+    # Every watched instrument, across exchanges and sessions, is refreshed in a
+    # single ltp() call, which keeps the engine inside the quote rate limit
+    key = f"{exchange}:{symbol}"
+    with _ltp_lock:
+        _watch[key] = time.monotonic()
+        hit = _ltp.get(key)
+    if hit is not None and time.monotonic() - hit[0] < LTP_TTL:
+        return hit[1]
+
+    # One caller refreshes for everyone. The rest take the last price rather
+    # than wait on its round trip or rate-limit sleep; only an instrument with
+    # no price yet waits for the call in flight
+    if not _refresh_lock.acquire(blocking=hit is None):
+        return hit[1]
+    try:
+        with _ltp_lock:
+            now = time.monotonic()
+            hit = _ltp.get(key)
+            if hit is not None and now - hit[0] < LTP_TTL:
+                return hit[1]
+            for k in [k for k, t in _watch.items() if now - t > LTP_WATCH]:
+                del _watch[k]
+                _ltp.pop(k, None)
+            _watch[key] = now
+            keys = list(_watch)
+
+        quotes = kite.ltp(*keys)
+
+        with _ltp_lock:
+            for k, q in quotes.items():
+                _ltp[k] = (now, q["last_price"])
+        return quotes[key]["last_price"]
+    finally:
+        _refresh_lock.release()
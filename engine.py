@@ -0,0 +1,744 @@
+# engine.py
+import hashlib
+import os
+import time
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+from datetime import datetime
+from types import SimpleNamespace
+import pytz
+
+from indicators import EMA_SLOW
+from candles import CandleStore
+from strategy import bullish_crossover
+from data import get_candles_zk, get_ltp as cached_ltp
+from instruments import master
+from zerodha_client import get_kite, warm_up, throttled_ms
+from scheduler import start_scheduler
+from journal import journal
+from profiler import profiler
+from exits import ExchangeExits, entry_product
+from paper_broker import PaperBroker
+from pipeline import Stage, Pipeline, DROP_OLDEST
+from sessions import Session, Run, log_sink, get_session, session_for_user, drop_session, all_sessions, submit
+
+IST = pytz.timezone("Asia/Kolkata")
+
+PUBLISH_INTERVAL = float(os.getenv("PUBLISH_INTERVAL", "0.5"))
+SNAPSHOT_LOGS    = 50
+STRATEGY         = "ema_20_50_crossover"
+POLL_INTERVAL    = float(os.getenv("POLL_INTERVAL", "2"))
+# Trade around the clock, e.g. against the fake backend in loadtest.py
+IGNORE_MARKET_HOURS = os.getenv("IGNORE_MARKET_HOURS", "0") == "1"
+SIGNAL_BARS      = EMA_SLOW + 1
+FILL_TIMEOUT     = float(os.getenv("FILL_TIMEOUT", "5"))   # seconds a market order may take to fill
+FILL_POLL        = 0.25
+
+# The API talks to the engine over a local socket rather than inherited queues,
+# so an API that restarts reattaches to the engine that outlived it
+ENGINE_ADDRESS   = ("127.0.0.1", int(os.getenv("ENGINE_PORT", "47831")))
+OUT_QUEUE_SIZE   = 4096
+ORPHAN_GRACE     = 30   # seconds without an attached API before an idle engine exits
+
+
+def engine_authkey():
+    # Both processes load the same .env; this keeps other local users off the socket.
+    # Without a secret the key would be a public constant, so refuse to run at all.
+    secret = os.getenv("API_SECRET")
+    if not secret:
+        raise RuntimeError("API_SECRET is not set; refusing to open the engine socket without it.")
+    return hashlib.sha256(f"algo-engine:{secret}".encode()).digest()
+
+
+# ── Helpers ──
+def is_market_open():
+    if IGNORE_MARKET_HOURS:
+        return True
+    now = datetime.now(IST)
+    if now.weekday() >= 5:
+        return False
+    market_open  = now.replace(hour=9,  minute=15, second=0, microsecond=0)
+    market_close = now.replace(hour=15, minute=30, second=0, microsecond=0)
+    return market_open <= now <= market_close
+
+def is_eod():
+    if IGNORE_MARKET_HOURS:
+        return False
+    now = datetime.now(IST)
+    return now >= now.replace(hour=15, minute=20, second=0, microsecond=0)
+
+def place_order(run, broker, exchange, symbol, qty, transaction_type, product):
+    log = run.log
+    action = "BUY" if transaction_type == broker.TRANSACTION_TYPE_BUY else "SELL"
+    user_id, dry_run = run.session.state["user_id"], run.state["dry_run"]
+    try:
+        order_id = broker.place_order(
+            variety=broker.VARIETY_REGULAR,
+            exchange=exchange,
+            tradingsymbol=symbol,
+            transaction_type=transaction_type,
+            quantity=qty,
+            product=product,
+            order_type=broker.ORDER_TYPE_MARKET,
+        )
+    except Exception as e:
+        log(f"[ORDER FAILED] {action} {symbol} | Error: {e}")
+        journal.order(user_id, symbol, action, qty, None, "FAILED", dry_run)
+        return None
+    if dry_run:
+        log(f"[DRY RUN] {action} {qty} x {symbol} | ID: {order_id}")
+        journal.order(user_id, symbol, action, qty, str(order_id), "DRY_RUN", dry_run)
+    else:
+        log(f"[ORDER PLACED] {action} {qty} x {symbol} | ID: {order_id}")
+        journal.order(user_id, symbol, action, qty, str(order_id), "PLACED", dry_run)
+    return order_id
+
+def await_fill(run, broker, order_id, symbol):
+    """Poll a placed order until it is final; return it if COMPLETE, else None."""
+    deadline = time.monotonic() + FILL_TIMEOUT
+    while True:
+        try:
+            history = broker.order_history(order_id)
+        except Exception as e:
+            run.log(f"[ORDER STATUS] {symbol} | ID: {order_id} | Error: {e}")
+            history = []
+        order  = history[-1] if history else {}
+        status = order.get("status")
+        if status == broker.STATUS_COMPLETE:
+            return order
+        if status in (broker.STATUS_REJECTED, broker.STATUS_CANCELLED):
+            run.log(f"[ORDER {status}] {symbol} | ID: {order_id} | {order.get('status_message') or 'no reason given'}")
+            return None
+        if time.monotonic() > deadline:
+            # Don't leave a market order working that the algo has given up on
+            try:
+                broker.cancel_order(variety=broker.VARIETY_REGULAR, order_id=order_id)
+            except Exception:
+                pass
+            run.log(f"[ORDER UNFILLED] {symbol} | ID: {order_id} | Status: {status} after {FILL_TIMEOUT:g}s")
+            return None
+        time.sleep(FILL_POLL)
+
+def execute(run, broker, leg, qty, transaction_type):
+    # A market order and its confirmed fill; None if either failed
+    order_id = place_order(run, broker, leg["exchange"], leg["symbol"], qty, transaction_type, leg["product"])
+    if order_id is None:
+        return None
+    return await_fill(run, broker, order_id, leg["symbol"])
+
+def get_ltp(kite, leg):
+    ltp = cached_ltp(kite, leg["exchange"], leg["symbol"])
+    journal.tick(leg["symbol"], ltp)
+    return ltp
+
+def new_leg(side, contract, product):
+    return {
+        "side": side, "symbol": contract["symbol"], "strike": contract["strike"],
+        "exchange": contract["exchange"], "product": product,
+        "state_key": "call_entry" if side == "CE" else "put_entry",
+        "entry": None, "entry_ts": None, "entry_latency_ms": None, "exits": None,
+    }
+
+def strategy_name(run):
+    # Journal aggregates are kept per strategy, so each underlying gets its own row
+    return f"{STRATEGY}:{run.underlying}"
+
+def enter_leg(run, broker, leg, qty, signal_ts):
+    # Returns False unless the buy is confirmed filled; the leg stays flat then
+    user_id = run.session.state["user_id"]
+    order = execute(run, broker, leg, qty, broker.TRANSACTION_TYPE_BUY)
+    if order is None:
+        return False
+    price = order["average_price"]
+    leg["entry"] = price
+    leg["entry_ts"], leg["entry_latency_ms"] = journal.fill(
+        user_id, strategy_name(run), leg["symbol"], leg["strike"], "BUY", qty, price, "ENTRY", signal_ts)
+    run.state[leg["state_key"]] = price
+    run.log(f"[BUY - {leg['side']}] {leg['symbol']} | Qty: {qty} | Price: ₹{price}")
+    return True
+
+def arm_exits(run, kite, broker, leg, qty, config):
+    # On failure the leg simply falls back to client-side TP/SL polling
+    exits = None
+    try:
+        exits = ExchangeExits(
+            broker, config.exit_mode, leg["exchange"], leg["symbol"], qty,
+            leg["entry"], config.profit_points, config.stoploss_points,
+        )
+        leg["exits"] = exits.place(get_ltp(kite, leg))
+        run.log(f"[EXITS ARMED] {leg['symbol']} | SL: ₹{exits.stoploss} | Target: ₹{exits.target} | Mode: {config.exit_mode}")
+    except Exception as e:
+        # e.g. the SL went in and the target failed: nothing may rest unmanaged
+        if exits is not None:
+            exits.cancel()
+        leg["exits"] = None
+        run.log(f"[EXITS FAILED] {leg['symbol']} | Falling back to polling | Error: {e}")
+
+def book_exit(run, leg, qty, price, reason, signal_ts):
+    user_id = run.session.state["user_id"]
+    pnl = (price - leg["entry"]) * qty
+    run.state["pnl"] += pnl
+    run.log(f"[SELL - {reason}] {leg['symbol']} | Price: ₹{price} | PnL: ₹{pnl:.2f}")
+    exit_ts, exit_latency_ms = journal.fill(
+        user_id, strategy_name(run), leg["symbol"], leg["strike"], "SELL", qty, price, reason, signal_ts)
+    journal.trade(
+        user_id=user_id, strategy=strategy_name(run), symbol=leg["symbol"], strike=leg["strike"], qty=qty,
+        entry_ts=leg["entry_ts"], entry_price=float(leg["entry"]), exit_ts=exit_ts,
+        exit_price=float(price), pnl=float(pnl), reason=reason,
+        entry_latency_ms=leg["entry_latency_ms"], exit_latency_ms=exit_latency_ms,
+    )
+    leg["entry"] = None
+    leg["exits"] = None
+    run.state[leg["state_key"]] = None
+
+def exit_leg(run, broker, leg, qty, reason, signal_ts):
+    order = execute(run, broker, leg, qty, broker.TRANSACTION_TYPE_SELL)
+    if order is None:
+        # Still long; the next tick (or EOD pass) tries again
+        run.log(f"[EXIT FAILED] {leg['symbol']} | {reason} | Position still open")
+        return False
+    book_exit(run, leg, qty, order["average_price"], reason, signal_ts)
+    return True
+
+def check_exchange_exit(run, leg, qty, orders_by_id):
+    # The exchange already executed the exit; we only book it, so no signal latency
+    exits = leg["exits"]
+    done = exits.poll(orders_by_id)
+    if exits.alert:
+        run.log(f"[EXITS ALERT] {leg['symbol']} | {exits.alert}")
+        exits.alert = None
+    if done is not None:
+        reason, price = done
+        book_exit(run, leg, qty, price, reason, None)
+    elif exits.failed:
+        leg["exits"] = None
+        run.log(f"[EXITS FAILED] {leg['symbol']} | Falling back to polling | {exits.failed}")
+    return done
+
+
+# ── Pipeline Stages ──
+# feed (run_feed, the run's pool thread) → indicators → strategy → execution.
+# Each stage owns a bounded queue and thread; the feed blocks when indicators or
+# strategy fall behind, while logging and snapshots are drained elsewhere and
+# never hold up ticks or orders. Events are plain tuples tagged by kind.
+
+def build_pipeline(run, kite, broker, config, legs, qty):
+    span = profiler.span
+    user = run.session.state["user_id"]
+    call_leg, put_leg = legs
+
+    def on_error(stage, e):
+        run.log(f"[ERROR] {stage.name}: {e}")
+
+    # Only the indicators stage writes these buffers; strategy gets a copy of the
+    # last SIGNAL_BARS rows so a later merge can never shift what it is reading
+    candle_store = CandleStore()
+
+    def indicators(event):
+        _, ce_key, ce_candles, pe_key, pe_candles = event
+        with span("indicators", user=user, underlying=run.underlying):
+            ce_buf = candle_store.get(*ce_key)
+            pe_buf = candle_store.get(*pe_key)
+            ce_buf.merge(ce_candles)
+            pe_buf.merge(pe_candles)
+        return [("indicators", ce_buf.tail(SIGNAL_BARS).copy(), pe_buf.tail(SIGNAL_BARS).copy())]
+
+    def signal(leg, kind, price, ts=None):
+        # Stamped where the decision is made, so fill latency covers the queue
+        # to execution as well as the order round trip
+        return journal.signal(user, strategy_name(run), leg["symbol"], leg["strike"], kind, price, ts=ts)
+
+    def strategy(event):
+        kind = event[0]
+        if kind == "indicators":
+            _, ce_rows, pe_rows = event
+            intents = []
+            with span("signal", user=user, underlying=run.underlying):
+                for leg, rows in ((call_leg, ce_rows), (put_leg, pe_rows)):
+                    if bullish_crossover(rows) and leg["entry"] is None:
+                        price = rows["close"][-2]
+                        intents.append(("enter", leg, signal(leg, "ENTRY", price)))
+            return intents
+        if kind == "tick":
+            _, leg, ltp = event
+            if leg["entry"] is None or leg["exits"] is not None:
+                return None
+            if ltp >= leg["entry"] + config.profit_points:
+                return [("exit", leg, "TARGET", signal(leg, "TARGET", ltp))]
+            if ltp <= leg["entry"] - config.stoploss_points:
+                return [("exit", leg, "STOPLOSS", signal(leg, "STOPLOSS", ltp))]
+            return None
+        if kind == "eod":
+            # Priced per leg in execution; the decision time is now
+            return [("eod", time.time())]
+        return [event]
+
+    def execution(event):
+        kind = event[0]
+        with span("orders", user=user, underlying=run.underlying, kind=kind):
+            # Intents can go stale while queued; the leg's current state decides
+            if kind == "enter":
+                _, leg, signal_ts = event
+                # Stopping drains the queues; a candle queued before /stop must not
+                # open a position nothing will manage. Exits and EOD still drain.
+                if run.stop_flag.is_set():
+                    run.log(f"[ENTRY SKIPPED] {leg['symbol']} | Algo stopped")
+                elif leg["entry"] is None:
+                    # Exits rest against a position, so only once the entry is filled
+                    if enter_leg(run, broker, leg, qty, signal_ts) and config.exit_mode != "poll":
+                        arm_exits(run, kite, broker, leg, qty, config)
+            elif kind == "exit":
+                _, leg, reason, signal_ts = event
+                if leg["entry"] is not None and leg["exits"] is None:
+                    exit_leg(run, broker, leg, qty, reason, signal_ts)
+            elif kind == "check_exits":
+                orders_by_id = None
+                if config.exit_mode == "exchange":
+                    orders_by_id = {o["order_id"]: o for o in broker.orders()}
+                for leg in legs:
+                    if leg["entry"] is not None and leg["exits"] is not None:
+                        check_exchange_exit(run, leg, qty, orders_by_id)
+            elif kind == "eod":
+                _, eod_ts = event
+                for leg in legs:
+                    if leg["exits"] is not None:
+                        # Book a last-moment exchange fill before withdrawing the rest
+                        if check_exchange_exit(run, leg, qty, None):
+                            continue
+                        leg["exits"].cancel()
+                        leg["exits"] = None
+                    if leg["entry"] is not None:
+                        signal_ts = signal(leg, "EOD", get_ltp(kite, leg), ts=eod_ts)
+                        exit_leg(run, broker, leg, qty, "EOD", signal_ts)
+        return None
+
+    return Pipeline(
+        Stage("indicators", indicators, maxsize=8,   on_error=on_error),
+        Stage("strategy",   strategy,   maxsize=256, on_error=on_error),
+        Stage("execution",  execution,  maxsize=256, on_error=on_error),
+    )
+
+
+def run_feed(run, kite, config, legs, head, ce_token, pe_token, timeframe, last_seen_candle_time):
+    """Market data stage: polls LTP and candles and pushes events into the pipeline."""
+    span = profiler.span
+    user = run.session.state["user_id"]
+    strategy_stage = head.downstream[0]
+
+    while not run.stop_flag.is_set():
+        started, throttled = time.perf_counter(), throttled_ms()
+        try:
+            # Waits are on the stop flag so /stop frees the pool worker at once
+            if not is_market_open():
+                run.stop_flag.wait(60)
+                continue
+
+            # One span per iteration; the fetch spans nest inside it
+            with span("iteration", user=user, underlying=run.underlying):
+                if is_eod():
+                    if any(leg["entry"] is not None for leg in legs):
+                        strategy_stage.put(("eod",))
+                else:
+                    with span("fetch", user=user, underlying=run.underlying, what="ltp"):
+                        for leg in legs:
+                            if leg["entry"] is not None and leg["exits"] is None:
+                                strategy_stage.put(("tick", leg, get_ltp(kite, leg)))
+                    if any(leg["exits"] is not None for leg in legs):
+                        strategy_stage.put(("check_exits",))
+
+                with span("fetch", user=user, underlying=run.underlying, what="candles"):
+                    ce_candles = get_candles_zk(kite, ce_token, timeframe)
+                    if ce_candles:
+                        new_time = ce_candles[-1]["date"]
+                        if new_time != last_seen_candle_time:
+                            pe_candles = get_candles_zk(kite, pe_token, timeframe)
+                            if pe_candles:
+                                last_seen_candle_time = new_time
+                                head.put(("candles", (ce_token, timeframe), ce_candles,
+                                          (pe_token, timeframe), pe_candles))
+
+            run.record_loop((time.perf_counter() - started) * 1000, throttled_ms() - throttled)
+            run.stop_flag.wait(POLL_INTERVAL)
+
+        except Exception as e:
+            run.log(f"[ERROR] {e}")
+            run.stop_flag.wait(10)
+
+
+# ── Algo Thread ──
+def run_algo(run: Run, config: SimpleNamespace):
+    session    = run.session
+    algo_state = run.state
+    log        = run.log
+
+    TF_MAP = {"1m":"minute", "3m": "3minute", "5m": "5minute", "15m": "15minute"}
+    ZK_TF  = TF_MAP[config.timeframe]
+
+    try:
+        kite = get_kite(session.state["access_token"], session.state["user_id"])
+    except Exception as e:
+        log(f"[ERROR] Login failed: {e}")
+        run.finish()
+        return
+
+    try:
+        ce, pe = master.resolve(
+            kite, config.underlying, config.call_strike, config.put_strike,
+            config.expiry, config.expiry_index,
+        )
+    except Exception as e:
+        log(f"[ERROR] Failed to resolve contracts: {e}")
+        run.finish()
+        return
+
+    # Lot size and exchange come from the instrument master, not from the index
+    LOT_SIZE = ce["lot_size"]
+    QTY      = config.lots * LOT_SIZE
+    EXPIRY   = ce["expiry"]
+
+    algo_state["exchange"]        = ce["exchange"]
+    algo_state["call_symbol"]     = ce["symbol"]
+    algo_state["put_symbol"]      = pe["symbol"]
+    algo_state["lot_size"]        = LOT_SIZE
+    algo_state["qty"]             = QTY
+    algo_state["profit_points"]   = config.profit_points
+    algo_state["stoploss_points"] = config.stoploss_points
+    algo_state["expiry"]          = str(EXPIRY)
+
+    mode = "DRY RUN" if config.dry_run else "LIVE"
+    log(f"Logged in as {session.state['user_name']} | Algo started | Mode: {mode} | {ce['exchange']} | CE: {ce['symbol']} | PE: {pe['symbol']} | Qty: {QTY} ({config.lots} x {LOT_SIZE}) | Expiry: {EXPIRY}")
+
+    init_candles = get_candles_zk(kite, ce["token"], ZK_TF)
+    last_seen_candle_time = init_candles[-1]["date"] if init_candles else None
+
+    # Dry runs send every order, entries included, to the in-memory broker
+    broker  = PaperBroker(kite) if config.dry_run else kite
+    product = entry_product(config.exit_mode)
+
+    call_leg = new_leg("CE", ce, product)
+    put_leg  = new_leg("PE", pe, product)
+    legs     = (call_leg, put_leg)
+
+    pipeline = build_pipeline(run, kite, broker, config, legs, QTY)
+    run.pipeline = pipeline.start()
+    try:
+        run_feed(run, kite, config, legs, pipeline.head, ce["token"], pe["token"], ZK_TF,
+                 last_seen_candle_time)
+    finally:
+        pipeline.stop()
+        run.finish()
+
+
+# ── Engine Process ──
+# Runs in its own OS process. Each attached API sends (req_id, name, kwargs) over
+# its connection and gets replies and state snapshots back through an ApiLink.
+# Nothing here ever waits on the API.
+
+def loop_stats(run: Run):
+    # Busy time of each feed iteration (fetches + hand-off), sleep and warm-up
+    # excluded. work_* also leaves out rate-limit waits, which depend on the
+    # account's call budget rather than on anything else the engine is doing
+    times = sorted(run.loop_ms)
+    work  = sorted(run.work_ms)
+    if not times:
+        return {"iterations": run.iterations, "samples": 0, "p50_ms": None, "p99_ms": None,
+                "max_ms": None, "work_p50_ms": None, "work_p99_ms": None}
+    return {
+        "iterations":  run.iterations,
+        "samples":     len(times),
+        "p50_ms":      round(times[len(times) // 2], 3),
+        "p99_ms":      round(times[int(len(times) * 0.99)], 3),
+        "max_ms":      round(times[-1], 3),
+        "work_p50_ms": round(work[len(work) // 2], 3),
+        "work_p99_ms": round(work[int(len(work) * 0.99)], 3),
+    }
+
+
+def run_snapshot(run: Run):
+    state = run.state
+    return {
+        "running":         state["running"],
+        "underlying":      state["underlying"],
+        "exchange":        state["exchange"],
+        "call_symbol":     state["call_symbol"],
+        "put_symbol":      state["put_symbol"],
+        "call_entry":      state["call_entry"],
+        "put_entry":       state["put_entry"],
+        "qty":             state["qty"],
+        "lot_size":        state["lot_size"],
+        "profit_points":   state["profit_points"],
+        "stoploss_points": state["stoploss_points"],
+        "expiry":          state["expiry"],
+        "pnl":             state["pnl"],
+        "dry_run":         state["dry_run"],
+        "pipeline":        run.pipeline.stats() if run.pipeline is not None else None,
+        "loop":            loop_stats(run),
+    }
+
+
+def snapshot(session: Session):
+    # Top-level fields describe the most recently started run, so single-index
+    # clients keep working; `strategies` lists every run by underlying
+    runs = {name: run_snapshot(run) for name, run in list(session.runs.items())}
+    latest = next(reversed(runs.values()), None) or run_snapshot(Run(session, None))
+    return dict(
+        latest,
+        running=session.running,
+        pnl=session.pnl,
+        logs=session.state["logs"][-SNAPSHOT_LOGS:],
+        strategies=runs,
+        ts=time.time(),
+    )
+
+
+def cmd_login(sid, user_id, user_name, access_token):
+    session = session_for_user(user_id, sid=sid)
+    session.state["user_name"]    = user_name
+    session.state["access_token"] = access_token
+    session.state["logged_in"]    = True
+    # Open the account's pooled connection now, not on the first order
+    kite = get_kite(access_token, user_id)
+    threading.Thread(target=warm_up, args=(kite,), daemon=True).start()
+    return {"status": "ok"}
+
+
+def on_auto_login(user_id, access_token):
+    for session in all_sessions():
+        if session.state["user_id"] == user_id:
+            session.state["access_token"] = access_token
+
+
+def cmd_logout(sid):
+    session = drop_session(sid)
+    if session is not None:
+        session.stop()
+        session.log("User logged out. Algo stopped.")
+    return {"status": "logged out"}
+
+
+def cmd_start(sid, config):
+    session = get_session(sid)
+    if session is None or not session.state["logged_in"]:
+        return {"status": "error", "message": "Please login with Zerodha first."}
+
+    underlying = config["underlying"]
+    with session.lock:
+        current = session.runs.get(underlying)
+        if current is not None and current.state["running"]:
+            return {"status": "already running"}
+
+        run = session.new_run(underlying)
+        run.state["dry_run"] = config["dry_run"]
+        run.state["running"] = True
+
+        try:
+            submit(run, run_algo, SimpleNamespace(**config))
+        except RuntimeError as e:
+            run.state["running"] = False
+            return {"status": "error", "message": str(e)}
+    return {"status": "started"}
+
+
+def cmd_stop(sid, underlying=None):
+    session = get_session(sid)
+    if session is not None:
+        session.stop(underlying)
+    return {"status": "stopping"}
+
+
+def cmd_profile_start(interval_ms=None):
+    profiler.start(interval_ms / 1000 if interval_ms is not None else None)
+    return profiler.status()
+
+
+def cmd_profile_stop():
+    profiler.stop()
+    return profiler.status()
+
+
+def cmd_profile_export(since=None, until=None, user=None):
+    # Scoped to the caller's account: spans carry the user of every session
+    return profiler.export(since, until, user=user)
+
+
+def cmd_sessions():
+    # Lets an API that restarted adopt the accounts this engine is still trading.
+    # Access tokens never cross the socket; the API reloads them from TOKEN_DIR.
+    return [
+        dict(sid=session.sid, user_id=session.state["user_id"], user_name=session.state["user_name"],
+             logged_in=session.state["logged_in"])
+        for session in all_sessions()
+    ]
+
+
+def cmd_ping():
+    return {"status": "ok", "pid": os.getpid()}
+
+
+# Run on their own thread so they never hold up /start or /stop behind them
+SLOW_COMMANDS = {"profile_export"}
+
+COMMANDS = {
+    "login":          cmd_login,
+    "logout":         cmd_logout,
+    "start":          cmd_start,
+    "stop":           cmd_stop,
+    "ping":           cmd_ping,
+    "sessions":       cmd_sessions,
+    "profile_start":  cmd_profile_start,
+    "profile_stop":   cmd_profile_stop,
+    "profile_status": profiler.status,
+    "profile_export": cmd_profile_export,
+}
+
+
+# ── API Links ──
+class ApiLink:
+    """One attached API process.
+
+    Outgoing messages go through a dropping queue drained by its own thread,
+    so a stalled or vanished API never slows the engine.
+    """
+
+    def __init__(self, conn):
+        self.conn   = conn
+        self.outbox = Stage("api-out", self._send, maxsize=OUT_QUEUE_SIZE,
+                            policy=DROP_OLDEST, on_error=lambda stage, e: None)
+        self.outbox.start()
+
+    def _send(self, message):
+        self.conn.send(message)
+
+    def send(self, message):
+        self.outbox.put(message)
+
+    def close(self):
+        # Stopping the outbox first flushes queued replies (e.g. to "shutdown")
+        self.outbox.stop()
+        self.conn.close()
+
+
+_links       = set()
+_links_lock  = threading.Lock()
+_detached_at = [time.monotonic()]
+
+
+def run_command(link, req_id, name, kwargs):
+    try:
+        result = COMMANDS[name](**kwargs)
+    except Exception as e:
+        result = {"status": "error", "message": str(e)}
+    link.send(("reply", req_id, result))
+
+
+def serve(conn, stop: threading.Event):
+    link = ApiLink(conn)
+    with _links_lock:
+        _links.add(link)
+    print(f"[ENGINE] API attached ({len(_links)} connected).")
+    try:
+        while not stop.is_set():
+            if not conn.poll(1):
+                continue
+            req_id, name, kwargs = conn.recv()
+            if name == "shutdown":
+                for session in all_sessions():
+                    cmd_stop(session.sid)
+                link.send(("reply", req_id, {"status": "ok"}))
+                stop.set()
+                break
+            if name in SLOW_COMMANDS:
+                threading.Thread(target=run_command, args=(link, req_id, name, kwargs),
+                                 name=f"cmd-{name}", daemon=True).start()
+            else:
+                run_command(link, req_id, name, kwargs)
+    except (EOFError, OSError):
+        print("[ENGINE] API disconnected; running sessions continue.")
+    finally:
+        with _links_lock:
+            _links.discard(link)
+            _detached_at[0] = time.monotonic()
+        link.close()
+
+
+def accept_loop(listener, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError, AuthenticationError):
+            continue
+        threading.Thread(target=serve, args=(conn, stop), name="api-link", daemon=True).start()
+
+
+def publisher(stop: threading.Event):
+    while not stop.is_set():
+        with _links_lock:
+            links = list(_links)
+        for session in all_sessions():
+            message = ("snapshot", session.sid, snapshot(session))
+            for link in links:
+                link.send(message)
+        stop.wait(PUBLISH_INTERVAL)
+
+
+def any_running():
+    return any(s.running for s in all_sessions())
+
+
+def all_flat():
+    return all(
+        run.state["call_entry"] is None and run.state["put_entry"] is None
+        for session in all_sessions() for run in list(session.runs.values())
+    )
+
+
+def orphan_done():
+    """True once an engine with no API attached has nothing left to manage.
+
+    Runs keep trading while detached, since a restarted API may attach again;
+    at EOD, once every position is squared off, they are stopped so the
+    engine exits on its own instead of polling a closed market forever.
+    """
+    with _links_lock:
+        if _links or time.monotonic() - _detached_at[0] < ORPHAN_GRACE:
+            return False
+    if not any_running():
+        print("[ENGINE] No API attached and nothing running; exiting.")
+        return True
+    if is_eod() and (all_flat() or not is_market_open()):
+        print("[ENGINE] No API attached; EOD square-off done, stopping all runs.")
+        for session in all_sessions():
+            session.stop()
+    return False
+
+
+def engine_main():
+    # Binding the address doubles as the single-engine lock: a second engine
+    # exits here and its API attaches to the one already running
+    try:
+        listener = Listener(ENGINE_ADDRESS, authkey=engine_authkey())
+    except OSError as e:
+        print(f"[ENGINE] {ENGINE_ADDRESS[0]}:{ENGINE_ADDRESS[1]} unavailable ({e}); not starting.")
+        return
+
+    stop = threading.Event()
+    journal.start()
+    log_sink.start()
+    start_scheduler(on_login=on_auto_login)
+    threading.Thread(target=publisher, args=(stop,), daemon=True).start()
+    threading.Thread(target=accept_loop, args=(listener, stop), name="api-accept", daemon=True).start()
+    print(f"[ENGINE] pid {os.getpid()} listening on {ENGINE_ADDRESS[0]}:{ENGINE_ADDRESS[1]}")
+
+    while not stop.wait(1):
+        if orphan_done():
+            stop.set()
+
+    for session in all_sessions():
+        session.stop()
+    with _links_lock:
+        links = list(_links)
+    for link in links:
+        link.close()
+    listener.close()
+    journal.close()
@@ -0,0 +1,150 @@
+# engine_client.py
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+from multiprocessing.connection import Client
+
+from engine import engine_main, engine_authkey, ENGINE_ADDRESS
+
+CALL_TIMEOUT    = float(os.getenv("ENGINE_CALL_TIMEOUT", "5"))
+CONNECT_TIMEOUT = 30
+
+
+class EngineClient:
+    """API-side handle on the engine process.
+
+    Snapshots are read from a plain dict that only the reader thread replaces,
+    so request handlers never take a lock or wait on the engine to serve status.
+    On start it attaches to an engine that outlived a previous API process, and
+    only spawns one if none is listening. If the connection is lost the engine
+    is reattached or respawned and `on_restart` is called so the API can
+    re-register its logged-in sessions.
+    """
+
+    def __init__(self, on_restart=None):
+        self._ctx        = mp.get_context("spawn")
+        self._ids        = itertools.count(1)
+        self._pending    = {}
+        self._closed     = threading.Event()
+        self._lost       = threading.Event()
+        self._send_lock  = threading.Lock()
+        self.snapshots   = {}
+        self.on_restart  = on_restart
+        self.restarts    = 0
+        self.proc        = None
+        self.conn        = None
+        self.attached    = False   # True when the engine was already running
+
+    # ── Lifecycle ──
+    def start(self):
+        self._connect()
+        threading.Thread(target=self._reader,   name="engine-reader",   daemon=True).start()
+        threading.Thread(target=self._watchdog, name="engine-watchdog", daemon=True).start()
+
+    def _connect(self):
+        try:
+            self.conn = Client(ENGINE_ADDRESS, authkey=engine_authkey())
+            self.attached = True
+            print(f"[ENGINE] attached to running engine at {ENGINE_ADDRESS[0]}:{ENGINE_ADDRESS[1]}")
+            return
+        except OSError:
+            pass
+
+        self._spawn()
+        self.attached = False
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while True:
+            try:
+                self.conn = Client(ENGINE_ADDRESS, authkey=engine_authkey())
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Engine did not start listening.")
+                time.sleep(0.1)
+
+    def _spawn(self):
+        # Not a daemon: if the API crashes, open positions keep being managed
+        self.proc = self._ctx.Process(target=engine_main, name="algo-engine", daemon=False)
+        self.proc.start()
+        print(f"[ENGINE] started pid {self.proc.pid}")
+
+    def shutdown(self):
+        # The reader must still be running to deliver the reply
+        if self.conn is not None:
+            self.call("shutdown")
+        self._closed.set()
+        if self.proc is not None:
+            self.proc.join(timeout=10)
+            if self.proc.is_alive():
+                self.proc.terminate()
+        if self.conn is not None:
+            self.conn.close()
+
+    # ── Commands ──
+    def call(self, name: str, timeout: float = CALL_TIMEOUT, **kwargs):
+        req_id = next(self._ids)
+        waiter = [threading.Event(), None]
+        self._pending[req_id] = waiter
+        try:
+            with self._send_lock:
+                self.conn.send((req_id, name, kwargs))
+            if not waiter[0].wait(timeout):
+                return {"status": "error", "message": "Engine did not respond."}
+            return waiter[1]
+        except (OSError, EOFError):
+            return {"status": "error", "message": "Engine unavailable."}
+        finally:
+            self._pending.pop(req_id, None)
+
+    def snapshot(self, sid: str):
+        return self.snapshots.get(sid)
+
+    # ── Background threads ──
+    def _reader(self):
+        while not self._closed.is_set():
+            conn = self.conn
+            try:
+                kind, key, payload = conn.recv()
+            except (EOFError, OSError):
+                if self._closed.is_set():
+                    return
+                self._lost.set()
+                # The watchdog swaps in a new connection
+                while self.conn is conn and not self._closed.is_set():
+                    time.sleep(0.2)
+                continue
+
+            if kind == "snapshot":
+                self.snapshots[key] = payload
+            elif kind == "reply":
+                waiter = self._pending.get(key)
+                if waiter is not None:
+                    waiter[1] = payload
+                    waiter[0].set()
+
+    def _watchdog(self):
+        while not self._closed.wait(1):
+            if not self._lost.is_set():
+                continue
+            exitcode = self.proc.exitcode if self.proc is not None else None
+            print(f"[ENGINE] connection lost (exit code {exitcode}); reconnecting")
+            self.restarts += 1
+            for sid, snap in list(self.snapshots.items()):
+                self.snapshots[sid] = dict(
+                    snap, running=False,
+                    strategies={k: dict(v, running=False) for k, v in snap.get("strategies", {}).items()},
+                    logs=snap["logs"] + ["[ENGINE] Engine process restarted. Algo stopped."],
+                )
+            for waiter in list(self._pending.values()):
+                waiter[1] = {"status": "error", "message": "Engine restarted."}
+                waiter[0].set()
+            try:
+                self._connect()
+            except RuntimeError as e:
+                print(f"[ENGINE] {e}; retrying")
+                continue
+            self._lost.clear()
+            if self.on_restart is not None:
+                self.on_restart()
@@ -0,0 +1,259 @@
+# exits.py
+import time
+
+from kiteconnect import KiteConnect
+
+EXIT_MODES = ("poll", "exchange", "gtt")
+TICK_SIZE  = 0.05
+MAX_REARMS = 3   # external cancellations re-armed before giving up on exchange exits
+GTT_SL_BUFFER    = 0.05   # GTT stoploss leg is a LIMIT this fraction below its trigger
+GTT_FILL_TIMEOUT = 10     # seconds a triggered GTT order may rest before it goes MARKET
+
+PENDING = ("OPEN", "TRIGGER PENDING", "OPEN PENDING", "VALIDATION PENDING",
+           "PUT ORDER REQ RECEIVED", "MODIFY PENDING")
+
+
+def to_tick(price: float):
+    return max(TICK_SIZE, round(round(price / TICK_SIZE) * TICK_SIZE, 2))
+
+
+def entry_product(mode: str):
+    # GTT orders only accept CNC/NRML; an MIS entry closed by an NRML sell
+    # would leave the MIS long open and add an NRML short
+    return KiteConnect.PRODUCT_NRML if mode == "gtt" else KiteConnect.PRODUCT_MIS
+
+
+class ExchangeExits:
+    """Target and stoploss for one open leg, resting at the exchange.
+
+    mode "exchange": an SL-M sell plus a LIMIT sell at the target. When one
+    fills the other is cancelled; if either is cancelled outside the algo it
+    is placed again, up to MAX_REARMS times. Both are full-quantity sells, so
+    if a whipsaw fills both the oversold quantity is bought back and `alert`
+    says so.
+    mode "gtt": a single GTT OCO (stoploss/target triggers). GTTs only accept
+    CNC/NRML, so this mode uses NRML and the entry must be NRML as well
+    (see entry_product). GTT legs are LIMIT orders; the stoploss leg is priced
+    GTT_SL_BUFFER below its trigger, and a triggered order still resting after
+    GTT_FILL_TIMEOUT (a gap through the limit) is converted to MARKET.
+
+    The position stays protected if this process stalls or dies; poll() only
+    books an exit once its order is COMPLETE, at the executed price. If the
+    exits can no longer be kept (a rejection, a dead GTT, too many
+    cancellations) everything resting is withdrawn and `failed` says why, so
+    the caller can fall back to polling.
+    """
+
+    def __init__(self, broker, mode, exchange, symbol, qty, entry, profit_points, stoploss_points):
+        self.broker   = broker
+        self.mode     = mode
+        self.exchange = exchange
+        self.symbol   = symbol
+        self.qty      = qty
+        self.target   = to_tick(entry + profit_points)
+        self.stoploss = to_tick(entry - stoploss_points)
+        self.product  = entry_product(mode)
+        self.sl_order_id     = None
+        self.target_order_id = None
+        self.gtt_id          = None
+        self.gtt_order       = None   # (order_id, reason) placed by a triggered GTT
+        self.gtt_order_at    = None   # monotonic time it was seen; None once converted
+        self.rearms          = 0
+        self.failed          = None
+        self.alert           = None
+
+    # ── Placement ──
+    def place(self, ltp: float):
+        if self.mode == "gtt":
+            self.gtt_id = self._place_gtt(ltp)
+        else:
+            self.sl_order_id     = self._place_sl()
+            self.target_order_id = self._place_target()
+        return self
+
+    def _place_sl(self):
+        kite = self.broker
+        return kite.place_order(
+            variety=kite.VARIETY_REGULAR,
+            exchange=self.exchange,
+            tradingsymbol=self.symbol,
+            transaction_type=kite.TRANSACTION_TYPE_SELL,
+            quantity=self.qty,
+            product=self.product,
+            order_type=kite.ORDER_TYPE_SLM,
+            trigger_price=self.stoploss,
+        )
+
+    def _place_target(self):
+        kite = self.broker
+        return kite.place_order(
+            variety=kite.VARIETY_REGULAR,
+            exchange=self.exchange,
+            tradingsymbol=self.symbol,
+            transaction_type=kite.TRANSACTION_TYPE_SELL,
+            quantity=self.qty,
+            product=self.product,
+            order_type=kite.ORDER_TYPE_LIMIT,
+            price=self.target,
+        )
+
+    def _place_gtt(self, ltp):
+        kite = self.broker
+        leg = {
+            "transaction_type": kite.TRANSACTION_TYPE_SELL,
+            "quantity":         self.qty,
+            "order_type":       kite.ORDER_TYPE_LIMIT,
+            "product":          self.product,
+        }
+        result = kite.place_gtt(
+            trigger_type=kite.GTT_TYPE_OCO,
+            tradingsymbol=self.symbol,
+            exchange=self.exchange,
+            trigger_values=[self.stoploss, self.target],
+            last_price=ltp,
+            orders=[dict(leg, price=to_tick(self.stoploss * (1 - GTT_SL_BUFFER))),
+                    dict(leg, price=self.target)],
+        )
+        return result["trigger_id"]
+
+    # ── Tracking ──
+    def poll(self, orders_by_id: dict = None):
+        """Return (reason, fill_price) once an exit has executed, else None."""
+        if self.failed or not self.is_active():
+            return None
+        if self.mode == "gtt":
+            return self._poll_gtt()
+
+        if orders_by_id is None:
+            orders_by_id = {o["order_id"]: o for o in self.broker.orders()}
+        sl     = orders_by_id.get(self.sl_order_id, {})
+        target = orders_by_id.get(self.target_order_id, {})
+
+        for filled, other_id, reason in ((sl, self.target_order_id, "STOPLOSS"),
+                                         (target, self.sl_order_id, "TARGET")):
+            if filled.get("status") == KiteConnect.STATUS_COMPLETE:
+                self._cancel(other_id)
+                self.sl_order_id = self.target_order_id = None
+                self._cover(other_id)
+                return reason, filled["average_price"]
+
+        # A rejection will only repeat if placed again
+        for order, name in ((sl, "stoploss"), (target, "target")):
+            if order.get("status") == KiteConnect.STATUS_REJECTED:
+                return self._fail(f"{name} order rejected: {order.get('status_message') or 'no reason given'}")
+
+        # Re-arm a leg that was cancelled outside the algo
+        sl_cancelled     = sl.get("status") == KiteConnect.STATUS_CANCELLED
+        target_cancelled = target.get("status") == KiteConnect.STATUS_CANCELLED
+        if sl_cancelled or target_cancelled:
+            if self.rearms >= MAX_REARMS:
+                return self._fail(f"exit orders cancelled {self.rearms + 1} times")
+            self.rearms += 1
+            try:
+                if sl_cancelled:
+                    self.sl_order_id = self._place_sl()
+                if target_cancelled:
+                    self.target_order_id = self._place_target()
+            except Exception as e:
+                return self._fail(f"re-arm failed: {e}")
+        return None
+
+    def _poll_gtt(self):
+        if self.gtt_order is None:
+            gtt = self.broker.get_gtt(self.gtt_id)
+            status = gtt["status"]
+            if status == KiteConnect.GTT_STATUS_ACTIVE:
+                return None
+            self.gtt_id = None
+            if status != KiteConnect.GTT_STATUS_TRIGGERED:
+                return self._fail(f"GTT {status}")
+            # orders[0] is the stoploss leg, orders[1] the target (see _place_gtt)
+            for leg, reason in zip(gtt["orders"], ("STOPLOSS", "TARGET")):
+                result = (leg.get("result") or {}).get("order_result") or {}
+                if not result:
+                    continue
+                if result.get("status") != "success" or not result.get("order_id"):
+                    return self._fail(f"GTT {reason.lower()} order failed: "
+                                      f"{result.get('rejection_reason') or 'no reason given'}")
+                self.gtt_order    = (result["order_id"], reason)
+                self.gtt_order_at = time.monotonic()
+                break
+            else:
+                return self._fail("GTT triggered without placing an order")
+
+        # Triggering only places the order; book it once executed, at its price
+        order_id, reason = self.gtt_order
+        history = self.broker.order_history(order_id)
+        order = history[-1] if history else {}
+        status = order.get("status")
+        if status == KiteConnect.STATUS_COMPLETE:
+            self.gtt_order = None
+            return reason, order["average_price"]
+        if status in (KiteConnect.STATUS_REJECTED, KiteConnect.STATUS_CANCELLED):
+            self.gtt_order = None
+            return self._fail(f"GTT {reason.lower()} order {status.lower()}: "
+                              f"{order.get('status_message') or 'no reason given'}")
+        # The price gapped through the limit; take the market rather than rest unfilled
+        if self.gtt_order_at is not None and time.monotonic() - self.gtt_order_at >= GTT_FILL_TIMEOUT:
+            try:
+                self.broker.modify_order(variety=self.broker.VARIETY_REGULAR, order_id=order_id,
+                                         order_type=self.broker.ORDER_TYPE_MARKET)
+                self.gtt_order_at = None
+            except Exception as e:
+                print(f"[EXITS] convert {order_id} to MARKET failed: {e}")
+        return None
+
+    def _fail(self, reason):
+        self.cancel()
+        self.failed = reason
+        return None
+
+    def _cancel(self, order_id):
+        if order_id is None:
+            return
+        try:
+            self.broker.cancel_order(variety=self.broker.VARIETY_REGULAR, order_id=order_id)
+        except Exception as e:
+            print(f"[EXITS] cancel {order_id} failed: {e}")
+
+    def _cover(self, order_id):
+        # The other leg may have executed too before its cancel landed, which
+        # leaves the position short by whatever it sold
+        history = self.broker.order_history(order_id)
+        sold = (history[-1].get("filled_quantity") or 0) if history else 0
+        if not sold:
+            return
+        self.alert = f"both exit orders executed; buying back {sold} oversold"
+        print(f"[EXITS] !!! {self.symbol}: {self.alert}")
+        kite = self.broker
+        try:
+            kite.place_order(
+                variety=kite.VARIETY_REGULAR,
+                exchange=self.exchange,
+                tradingsymbol=self.symbol,
+                transaction_type=kite.TRANSACTION_TYPE_BUY,
+                quantity=sold,
+                product=self.product,
+                order_type=kite.ORDER_TYPE_MARKET,
+            )
+        except Exception as e:
+            self.alert = f"both exit orders executed and the buy-back of {sold} failed, position is SHORT: {e}"
+            print(f"[EXITS] !!! {self.symbol}: {self.alert}")
+
+    def cancel(self):
+        """Withdraw every resting exit, e.g. before an EOD market square-off."""
+        if self.gtt_id is not None:
+            try:
+                self.broker.delete_gtt(self.gtt_id)
+            except Exception as e:
+                print(f"[EXITS] delete GTT {self.gtt_id} failed: {e}")
+            self.gtt_id = None
+        if self.gtt_order is not None:
+            self._cancel(self.gtt_order[0])
+            self.gtt_order = None
+        self._cancel(self.sl_order_id)
+        self._cancel(self.target_order_id)
+        self.sl_order_id = self.target_order_id = None
+
+    def is_active(self):
+        return any((self.sl_order_id, self.target_order_id, self.gtt_id, self.gtt_order))
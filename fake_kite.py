@@ -0,0 +1,169 @@
+# fake_kite.py
+import itertools
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+import pytz
+
+from instruments import UNDERLYINGS
+from zerodha_client import ThrottledKite
+
+IST = pytz.timezone("Asia/Kolkata")
+
+# Simulated round trip per call, and wall-clock seconds per candle so
+# crossovers (and therefore orders) happen within a short load test
+LATENCY     = float(os.getenv("FAKE_KITE_LATENCY_MS", "20")) / 1000
+BAR_SECONDS = float(os.getenv("FAKE_KITE_BAR_SECONDS", "5"))
+BARS        = 200
+WAVE_BARS   = 60     # closes follow a sine of this period, so EMA20/50 keep crossing
+
+# underlying → (spot, strike step, lot size)
+MARKET = {
+    "SENSEX":    (82000, 100, 20),
+    "BANKEX":    (62000, 100, 30),
+    "NIFTY":     (25000, 50,  75),
+    "BANKNIFTY": (55000, 100, 35),
+}
+STRIKES_EACH_SIDE = 20
+WEEKS             = 10
+
+
+def atm_strike(underlying):
+    spot, step, _ = MARKET[underlying]
+    return spot - spot % step
+
+
+class FakeKite(ThrottledKite):
+    """Offline KiteConnect for load tests (KITE_BACKEND=fake).
+
+    Serves a generated instrument master, random-walk LTPs and sine-wave
+    candles, with LATENCY added to every call. Calls still go through the
+    rate limiters of ThrottledKite, so the engine sees realistic waits.
+    """
+
+    def __init__(self, api_key=None, **kwargs):
+        super().__init__(api_key=api_key or "fake", **kwargs)
+        self._prices = {}
+        self._orders = {}
+        self._ids    = itertools.count(1)
+        self._lock   = threading.Lock()
+
+    def _call(self, limit=None):
+        if limit is not None:
+            self._throttle(limit)
+        time.sleep(LATENCY)
+
+    # ── Auth ──
+    def login_url(self):
+        return "/callback?status=success&request_token=fake"
+
+    def generate_session(self, request_token, api_secret=None):
+        self._call()
+        access_token = f"fake-{request_token}"
+        self.set_access_token(access_token)
+        return {"access_token": access_token, "user_id": f"FK{request_token}".upper()[:12]}
+
+    def profile(self):
+        self._call("default")
+        return {"user_name": f"Load {self.access_token}", "user_id": self.access_token}
+
+    # ── Instruments ──
+    def instruments(self, exchange=None):
+        self._call("default")
+        today = datetime.now(IST).date()
+        # Thursdays, like the NSE weekly cycle; monthly = last of each month
+        first = today + timedelta(days=(3 - today.weekday()) % 7)
+        expiries = [first + timedelta(weeks=w) for w in range(WEEKS)]
+
+        rows = []
+        for name, segment in UNDERLYINGS.items():
+            if exchange is not None and segment != exchange:
+                continue
+            spot, step, lot_size = MARKET[name]
+            atm = atm_strike(name)
+            for expiry in expiries:
+                for k in range(-STRIKES_EACH_SIDE, STRIKES_EACH_SIDE + 1):
+                    strike = atm + k * step
+                    for kind in ("CE", "PE"):
+                        symbol = f"{name}{expiry:%y%m%d}{strike}{kind}"
+                        rows.append({
+                            "instrument_token": zlib.crc32(symbol.encode()) % 10**8,
+                            "exchange_token":   "0",
+                            "tradingsymbol":    symbol,
+                            "name":             name,
+                            "last_price":       0.0,
+                            "expiry":           expiry,
+                            "strike":           float(strike),
+                            "tick_size":        0.05,
+                            "lot_size":         lot_size,
+                            "instrument_type":  kind,
+                            "segment":          f"{segment}-OPT",
+                            "exchange":         segment,
+                        })
+        return rows
+
+    # ── Market data ──
+    def ltp(self, *instruments):
+        self._call("quote")
+        out = {}
+        with self._lock:
+            for key in instruments:
+                price = self._prices.get(key, 150.0)
+                price = max(0.05, round(price + random.gauss(0, 1.5), 2))
+                self._prices[key] = price
+                out[key] = {"instrument_token": 0, "last_price": price}
+        return out
+
+    def historical_data(self, instrument_token, from_date, to_date, interval, continuous=False, oi=False):
+        self._call("historical")
+        now   = int(time.time() // BAR_SECONDS)
+        phase = (instrument_token % 97) / 97 * 2 * math.pi
+        out   = []
+        for n in range(now - BARS + 1, now + 1):
+            close = round(150 + 40 * math.sin(2 * math.pi * n / WAVE_BARS + phase), 2)
+            out.append({
+                "date":   datetime.fromtimestamp(n * BAR_SECONDS, IST),
+                "open":   close, "high": close + 1, "low": close - 1, "close": close,
+                "volume": 1000,
+            })
+        return out
+
+    # ── Orders (live mode against the fake; dry runs use PaperBroker) ──
+    def place_order(self, variety, exchange, tradingsymbol, transaction_type, quantity, product,
+                    order_type, price=None, trigger_price=None, **kwargs):
+        self._call("order")
+        order_id = f"FAKE{next(self._ids)}"
+        # Market orders fill at once at the last simulated price; others rest
+        market = order_type == self.ORDER_TYPE_MARKET
+        with self._lock:
+            self._orders[order_id] = {
+                "order_id": order_id, "exchange": exchange, "tradingsymbol": tradingsymbol,
+                "transaction_type": transaction_type, "quantity": quantity, "product": product,
+                "order_type": order_type, "price": price or 0, "trigger_price": trigger_price or 0,
+                "status": self.STATUS_COMPLETE if market else "OPEN",
+                "average_price": self._prices.get(f"{exchange}:{tradingsymbol}", 150.0) if market else 0,
+                "filled_quantity": quantity if market else 0, "status_message": None,
+            }
+        return order_id
+
+    def cancel_order(self, variety, order_id, parent_order_id=None):
+        self._call("order")
+        with self._lock:
+            order = self._orders[order_id]
+            if order["status"] == "OPEN":
+                order["status"] = self.STATUS_CANCELLED
+        return order_id
+
+    def orders(self):
+        self._call("default")
+        with self._lock:
+            return [dict(o) for o in self._orders.values()]
+
+    def order_history(self, order_id):
+        self._call("default")
+        with self._lock:
+            return [dict(self._orders[order_id])]
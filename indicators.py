@@ -1,3 +1,13 @@
+EMA_FAST = 20
+EMA_SLOW = 50
+
+
+def ema_next(prev, close, span):
+    # One step of ewm(span, adjust=False): same recurrence pandas uses
+    alpha = 2.0 / (span + 1)
+    return alpha * close + (1 - alpha) * prev
+
+
 def add_ema(df):
     df = df.copy()
 
@@ -8,6 +18,6 @@ def add_ema(df):
         else:
             raise KeyError(f"'close' column not found. Columns: {list(df.columns)}")
 
-    df["ema20"] = df["close"].ewm(span=20, adjust=False).mean()
-    df["ema50"] = df["close"].ewm(span=50, adjust=False).mean()
+    df["ema20"] = df["close"].ewm(span=EMA_FAST, adjust=False).mean()
+    df["ema50"] = df["close"].ewm(span=EMA_SLOW, adjust=False).mean()
     return df
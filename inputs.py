@@ -1,8 +1,12 @@
 # inputs.py
+from instruments import UNDERLYINGS, EXPIRY_KINDS
 
 def get_user_inputs():
-    print("\n Sensex Options EMA Algo Setup \n")
+    print("\n Index Options EMA Algo Setup \n")
 
+    underlying = (input(f"Enter underlying ({' / '.join(UNDERLYINGS)}) [SENSEX]: ").strip() or "SENSEX").upper()
+    expiry = (input("Enter expiry (weekly / monthly) [weekly]: ").strip() or "weekly").lower()
+    expiry_index = int(input("Which expiry (0 = nearest, 1 = next) [0]: ").strip() or 0)
     call_strike = int(input("Enter CALL strike (e.g., 78000): "))
     put_strike = int(input("Enter PUT strike (e.g., 77000): "))
     lots = int(input("Enter number of lots: "))
@@ -10,7 +14,11 @@ def get_user_inputs():
     stoploss_points = int(input("Enter stoploss points (e.g., 30): "))
     timeframe = input("Enter timeframe (3m / 5m / 15m): ").strip()
 
-    LOT_SIZE = 20  # Sensex lot size
+    if underlying not in UNDERLYINGS:
+        raise ValueError(f"Underlying must be one of {', '.join(UNDERLYINGS)}")
+
+    if expiry not in EXPIRY_KINDS or expiry_index < 0:
+        raise ValueError("Expiry must be 'weekly' or 'monthly', with 0 (nearest) or later")
 
     if timeframe not in ["3m", "5m", "15m"]:
         raise ValueError("Timeframe must be '3m', '5m' or '15m'")
@@ -22,10 +30,12 @@ def get_user_inputs():
         raise ValueError("Profit/Stoploss must be positive")
 
     return {
+        "UNDERLYING": underlying,
+        "EXPIRY": expiry,
+        "EXPIRY_INDEX": expiry_index,
         "CALL_STRIKE": call_strike,
         "PUT_STRIKE": put_strike,
         "LOTS": lots,
-        "LOT_SIZE": LOT_SIZE,
         "PROFIT_POINTS": profit_points,
         "STOPLOSS_POINTS": stoploss_points,
         "TIMEFRAME": timeframe
@@ -0,0 +1,92 @@
+# instruments.py
+import threading
+from datetime import datetime
+import pandas as pd
+import pytz
+
+IST = pytz.timezone("Asia/Kolkata")
+
+# Index → the derivatives segment its options trade on
+UNDERLYINGS = {
+    "SENSEX":    "BFO",
+    "BANKEX":    "BFO",
+    "NIFTY":     "NFO",
+    "BANKNIFTY": "NFO",
+}
+EXPIRY_KINDS = ("weekly", "monthly")
+
+
+class InstrumentMaster:
+    """Kite instrument dumps, downloaded once per exchange per day.
+
+    Shared by every session in the process: the NFO dump alone is tens of
+    thousands of rows, so it is fetched with whichever client asks first and
+    reused for all accounts and underlyings until the date changes.
+    """
+
+    def __init__(self):
+        self._frames = {}   # exchange → (date, DataFrame)
+        self._lock   = threading.Lock()
+
+    def frame(self, kite, exchange):
+        today = datetime.now(IST).date()
+        with self._lock:
+            cached = self._frames.get(exchange)
+            if cached is None or cached[0] != today:
+                cached = (today, pd.DataFrame(kite.instruments(exchange)))
+                self._frames[exchange] = cached
+        return cached[1]
+
+    def options(self, kite, underlying):
+        if underlying not in UNDERLYINGS:
+            raise ValueError(f"Unknown underlying {underlying}. Use one of {', '.join(UNDERLYINGS)}.")
+        df = self.frame(kite, UNDERLYINGS[underlying])
+        # `name` is exact; a tradingsymbol prefix would also match e.g. NIFTYNXT50
+        today = datetime.now(IST).date()
+        return df[(df["name"] == underlying) &
+                  (df["instrument_type"].isin(["CE", "PE"])) &
+                  (df["expiry"] >= today)]
+
+    def expiries(self, kite, underlying, kind="weekly"):
+        """Upcoming expiries, nearest first. Monthly = the last expiry of each month."""
+        if kind not in EXPIRY_KINDS:
+            raise ValueError(f"Expiry must be one of {', '.join(EXPIRY_KINDS)}.")
+        dates = sorted(set(self.options(kite, underlying)["expiry"]))
+        if kind == "monthly":
+            last = {}
+            for d in dates:
+                last[(d.year, d.month)] = d
+            dates = sorted(last.values())
+        return dates
+
+    def resolve(self, kite, underlying, call_strike, put_strike, expiry="weekly", expiry_index=0):
+        """Return the (CE, PE) contracts for the chosen expiry (0 = nearest, 1 = next, ...)."""
+        dates = self.expiries(kite, underlying, expiry)
+        if expiry_index >= len(dates):
+            raise ValueError(f"No {expiry} expiry #{expiry_index} listed for {underlying}.")
+        expiry_date = dates[expiry_index]
+
+        opts = self.options(kite, underlying)
+        opts = opts[opts["expiry"] == expiry_date]
+        ce_row = opts[(opts["strike"] == call_strike) & (opts["instrument_type"] == "CE")]
+        pe_row = opts[(opts["strike"] == put_strike)  & (opts["instrument_type"] == "PE")]
+
+        if ce_row.empty or pe_row.empty:
+            raise ValueError("Could not resolve CE/PE for given strikes. Check strikes or expiry.")
+        return contract(ce_row.iloc[0]), contract(pe_row.iloc[0])
+
+
+def contract(row):
+    return {
+        "symbol":     row["tradingsymbol"],
+        "token":      int(row["instrument_token"]),
+        "exchange":   row["exchange"],
+        "lot_size":   int(row["lot_size"]),
+        "strike":     float(row["strike"]),
+        "expiry":     row["expiry"],
+        "type":       row["instrument_type"],
+        "underlying": row["name"],
+    }
+
+
+master = InstrumentMaster()
@@ -0,0 +1,280 @@
+# journal.py
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import pytz
+
+IST = pytz.timezone("Asia/Kolkata")
+
+JOURNAL_PATH   = os.getenv("JOURNAL_PATH", "journal.db")
+RECORD_TICKS   = os.getenv("JOURNAL_TICKS", "0") == "1"
+QUEUE_SIZE     = 100_000
+BATCH_SIZE     = 500
+FLUSH_INTERVAL = 1.0
+AGG_INTERVAL   = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    ts REAL, day TEXT, user_id TEXT, strategy TEXT, symbol TEXT, strike INTEGER,
+    kind TEXT, price REAL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    ts REAL, day TEXT, user_id TEXT, symbol TEXT, side TEXT, qty INTEGER,
+    order_id TEXT, status TEXT, dry_run INTEGER
+);
+CREATE TABLE IF NOT EXISTS fills (
+    ts REAL, day TEXT, user_id TEXT, strategy TEXT, symbol TEXT, strike INTEGER,
+    side TEXT, qty INTEGER, price REAL, reason TEXT, latency_ms REAL
+);
+CREATE TABLE IF NOT EXISTS trades (
+    day TEXT, user_id TEXT, strategy TEXT, symbol TEXT, strike INTEGER, qty INTEGER,
+    entry_ts REAL, entry_price REAL, exit_ts REAL, exit_price REAL, pnl REAL,
+    reason TEXT, entry_latency_ms REAL, exit_latency_ms REAL
+);
+CREATE TABLE IF NOT EXISTS ticks (
+    ts REAL, symbol TEXT, ltp REAL
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    user_id TEXT, scope TEXT, key TEXT, data TEXT, updated REAL,
+    PRIMARY KEY (user_id, scope, key)
+);
+CREATE INDEX IF NOT EXISTS trades_user ON trades (user_id, exit_ts);
+CREATE INDEX IF NOT EXISTS trades_day ON trades (user_id, day);
+CREATE INDEX IF NOT EXISTS trades_strike ON trades (user_id, strike);
+CREATE INDEX IF NOT EXISTS trades_strategy ON trades (user_id, strategy);
+"""
+
+COLUMNS = {
+    "signals": ("ts", "day", "user_id", "strategy", "symbol", "strike", "kind", "price"),
+    "orders":  ("ts", "day", "user_id", "symbol", "side", "qty", "order_id", "status", "dry_run"),
+    "fills":   ("ts", "day", "user_id", "strategy", "symbol", "strike", "side", "qty", "price",
+                "reason", "latency_ms"),
+    "trades":  ("day", "user_id", "strategy", "symbol", "strike", "qty", "entry_ts", "entry_price",
+                "exit_ts", "exit_price", "pnl", "reason", "entry_latency_ms", "exit_latency_ms"),
+    "ticks":   ("ts", "symbol", "ltp"),
+}
+
+# Aggregate scope → the trades column it groups by
+SCOPES = {"daily": "day", "strike": "strike", "strategy": "strategy"}
+
+
+def today():
+    return datetime.now(IST).strftime("%Y-%m-%d")
+
+
+def connect(path: str = JOURNAL_PATH, readonly: bool = False):
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+    return conn
+
+
+class Journal:
+    """Trade/signal/tick store. record() only enqueues; one writer thread batches
+    inserts into SQLite and refreshes the analytics aggregates of the groups
+    new trades fall in (rebuilt in full once at start)."""
+
+    def __init__(self, path: str = JOURNAL_PATH):
+        self.path     = path
+        self.queue    = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped  = 0
+        self._thread  = None
+        self._stop    = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="journal", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    # ── Producers (trading path) ──
+    def record(self, table: str, **row):
+        if self._thread is None:
+            return
+        try:
+            self.queue.put_nowait((table, tuple(row.get(c) for c in COLUMNS[table])))
+        except queue.Full:
+            self.dropped += 1
+
+    def signal(self, user_id, strategy, symbol, strike, kind, price, ts=None):
+        ts = ts or time.time()
+        self.record("signals", ts=ts, day=today(), user_id=user_id, strategy=strategy,
+                    symbol=symbol, strike=strike, kind=kind, price=price)
+        return ts
+
+    def order(self, user_id, symbol, side, qty, order_id, status, dry_run):
+        self.record("orders", ts=time.time(), day=today(), user_id=user_id, symbol=symbol,
+                    side=side, qty=qty, order_id=order_id, status=status, dry_run=int(dry_run))
+
+    def fill(self, user_id, strategy, symbol, strike, side, qty, price, reason, signal_ts):
+        ts = time.time()
+        latency_ms = (ts - signal_ts) * 1000 if signal_ts else None
+        self.record("fills", ts=ts, day=today(), user_id=user_id, strategy=strategy, symbol=symbol,
+                    strike=strike, side=side, qty=qty, price=price, reason=reason,
+                    latency_ms=latency_ms)
+        return ts, latency_ms
+
+    def trade(self, **row):
+        self.record("trades", day=today(), **row)
+
+    def tick(self, symbol, ltp):
+        if RECORD_TICKS:
+            self.record("ticks", ts=time.time(), symbol=symbol, ltp=ltp)
+
+    # ── Writer ──
+    def _writer(self):
+        conn = connect(self.path)
+        last_agg = 0.0
+        changed  = set()   # aggregate groups with trades since the last refresh
+        try:
+            refresh_aggregates(conn)
+        except sqlite3.Error as e:
+            print(f"[JOURNAL] aggregate rebuild failed: {e}")
+
+        while True:
+            batch = self._drain()
+            if batch:
+                by_table = {}
+                for table, values in batch:
+                    by_table.setdefault(table, []).append(values)
+                try:
+                    with conn:
+                        for table, rows in by_table.items():
+                            cols = COLUMNS[table]
+                            conn.executemany(
+                                f"INSERT INTO {table} ({', '.join(cols)}) "
+                                f"VALUES ({', '.join('?' * len(cols))})",
+                                rows,
+                            )
+                    for values in by_table.get("trades", ()):
+                        changed.update(aggregate_groups(dict(zip(COLUMNS["trades"], values))))
+                except sqlite3.Error as e:
+                    print(f"[JOURNAL] write failed, {len(batch)} rows lost: {e}")
+
+            now = time.time()
+            if changed and now - last_agg >= AGG_INTERVAL:
+                try:
+                    refresh_aggregates(conn, changed)
+                except sqlite3.Error as e:
+                    print(f"[JOURNAL] aggregate refresh failed: {e}")
+                last_agg = now
+                changed  = set()
+
+            if self._stop.is_set() and self.queue.empty():
+                if changed:
+                    refresh_aggregates(conn, changed)
+                break
+
+        conn.close()
+
+    def _drain(self):
+        try:
+            batch = [self.queue.get(timeout=FLUSH_INTERVAL)]
+        except queue.Empty:
+            return []
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+
+# ── Aggregates ──
+def summarize(trades):
+    pnls = [t["pnl"] for t in trades]
+    latencies = [t[k] for t in trades for k in ("entry_latency_ms", "exit_latency_ms")
+                 if t[k] is not None]
+
+    peak = equity = max_dd = 0.0
+    for pnl in pnls:
+        equity += pnl
+        peak    = max(peak, equity)
+        max_dd  = max(max_dd, peak - equity)
+
+    wins = sum(1 for p in pnls if p > 0)
+    return {
+        "trades":         len(pnls),
+        "win_rate":       round(wins / len(pnls), 4) if pnls else None,
+        "avg_pnl":        round(sum(pnls) / len(pnls), 2) if pnls else None,
+        "total_pnl":      round(sum(pnls), 2),
+        "max_drawdown":   round(max_dd, 2),
+        "avg_latency_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        "max_latency_ms": round(max(latencies), 2) if latencies else None,
+    }
+
+
+def aggregate_key(scope, value):
+    # Strikes come in as floats from the engine and back as integers from SQLite
+    if scope == "strike" and value is not None and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def aggregate_groups(trade):
+    """The (user_id, scope, value) groups one trade row counts towards."""
+    return {(trade["user_id"], scope, trade[column]) for scope, column in SCOPES.items()}
+
+
+def refresh_aggregates(conn, groups=None):
+    """Recompute the aggregates of `groups` (see aggregate_groups) from their
+    trades, or rebuild every aggregate when `groups` is None."""
+    conn.row_factory = sqlite3.Row
+    try:
+        if groups is None:
+            trades = {}
+            for t in conn.execute("SELECT * FROM trades ORDER BY exit_ts"):
+                for group in aggregate_groups(t):
+                    trades.setdefault(group, []).append(t)
+        else:
+            trades = {
+                (user_id, scope, value): conn.execute(
+                    f"SELECT * FROM trades WHERE user_id = ? AND {SCOPES[scope]} = ? ORDER BY exit_ts",
+                    (user_id, value),
+                ).fetchall()
+                for user_id, scope, value in groups
+            }
+    finally:
+        conn.row_factory = None
+
+    now = time.time()
+    with conn:
+        if groups is None:
+            conn.execute("DELETE FROM aggregates")
+        conn.executemany(
+            "INSERT OR REPLACE INTO aggregates (user_id, scope, key, data, updated) VALUES (?, ?, ?, ?, ?)",
+            [(user_id, scope, aggregate_key(scope, value), json.dumps(summarize(rows)), now)
+             for (user_id, scope, value), rows in trades.items()],
+        )
+
+
+def read_aggregates(user_id: str, path: str = JOURNAL_PATH):
+    result = {"daily": {}, "strike": {}, "strategy": {}}
+    if not os.path.exists(path):
+        return result
+    conn = connect(path, readonly=True)
+    try:
+        for scope, key, data in conn.execute(
+            "SELECT scope, key, data FROM aggregates WHERE user_id = ?", (user_id,)
+        ):
+            result[scope][key] = json.loads(data)
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        conn.close()
+    return result
+
+
+journal = Journal()
@@ -0,0 +1,410 @@
+# loadtest.py
+"""Load and latency harness for the FastAPI control plane.
+
+Starts main_api.py under uvicorn against the fake Kite backend, logs in a few
+accounts and starts their strategies, then:
+
+  1. baseline: the engine trades with no API traffic;
+  2. load: the strategies are restarted and --clients browser tabs / pollers
+     hammer /status (plus the dashboard, /auth-status and /start) while
+     --churn clients cycle /start and /stop on accounts of their own.
+
+Reports p50/p99 per endpoint, snapshot staleness, and the engine's feed-loop
+iteration latency in both phases. Each phase runs until every run has
+--min-samples loop samples past its warm-up, so p99 is not just the max. Exits 1
+if the harness aborts part way (the report still prints what was measured),
+if a phase falls short of its samples, if the loaded p99 of loop work (iteration time
+minus rate-limit waits, which follow the account's call budget and whether
+positions are open, not API traffic) exceeds the baseline's by more than
+--loop-delta-ms, or if an optional --loop-budget-ms / --endpoint-budget-ms cap
+is exceeded.
+
+    python loadtest.py --clients 100 --duration 30 --underlyings SENSEX,NIFTY
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from fake_kite import atm_strike
+from instruments import UNDERLYINGS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ── Server ──
+def start_server(port, workdir, args):
+    env = dict(
+        os.environ,
+        KITE_BACKEND="fake",
+        IGNORE_MARKET_HOURS="1",
+        POLL_INTERVAL=str(args.poll_interval),
+        FAKE_KITE_LATENCY_MS=str(args.kite_latency_ms),
+        API_KEY=os.getenv("API_KEY") or "fake",
+        API_SECRET=os.getenv("API_SECRET") or "fake",
+        TOKEN_DIR=os.path.join(workdir, "tokens"),
+        JOURNAL_PATH=os.path.join(workdir, "journal.db"),
+        PROFILE_DIR=os.path.join(workdir, "profiles"),
+        # Never attach to (or collide with) an engine serving the real API
+        ENGINE_PORT=str(free_port()),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main_api:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env,
+        # The engine echoes every session log line; keep the report readable
+        stdout=None if args.server_logs else subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+        try:
+            if requests.get(f"{base}/auth-status", timeout=1).ok:
+                return proc, base
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not come up within 30s")
+
+
+def stop_server(proc):
+    # SIGINT lets FastAPI's shutdown hook stop the engine process cleanly
+    proc.send_signal(signal.SIGINT)
+    try:
+        proc.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ── Accounts ──
+def login(base, name):
+    http = requests.Session()
+    r = http.get(f"{base}/callback", params={"status": "success", "request_token": name},
+                 allow_redirects=False, timeout=10)
+    if "algo_session" not in http.cookies:
+        raise RuntimeError(f"login {name} failed: HTTP {r.status_code}")
+    return http
+
+
+def algo_config(underlying, args):
+    strike = atm_strike(underlying)
+    return {
+        "underlying": underlying, "call_strike": strike, "put_strike": strike,
+        "lots": 1, "profit_points": 20, "stoploss_points": 20, "timeframe": "1m",
+        "dry_run": True, "exit_mode": args.exit_mode,
+    }
+
+
+def start_all(http, base, args):
+    for underlying in args.underlyings:
+        reply = http.post(f"{base}/start", json=algo_config(underlying, args), timeout=10).json()
+        if reply.get("status") not in ("started", "already running"):
+            raise RuntimeError(f"start {underlying} failed: {reply}")
+
+
+def restart_all(http, base, args):
+    # A fresh run per phase gives each phase its own loop-latency window
+    http.post(f"{base}/stop", timeout=10)
+    start_all(http, base, args)
+
+
+def loop_samples(accounts, base, retries=3):
+    # Under load a /status read can be reset; retry before giving up
+    out = {}
+    for i, http in enumerate(accounts):
+        for attempt in range(retries):
+            try:
+                snap = http.get(f"{base}/status", timeout=10).json()
+                break
+            except requests.RequestException:   # JSON decode errors included
+                if attempt == retries - 1:
+                    raise
+                time.sleep(0.5)
+        for underlying, run in (snap.get("strategies") or {}).items():
+            out[f"acct{i}/{underlying}"] = run
+    return out
+
+
+def wait_for_samples(accounts, base, n, timeout):
+    # Loop samples exclude each run's warm-up iterations (see sessions.LOOP_WARMUP)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            runs = loop_samples(accounts, base)
+        except requests.RequestException:
+            runs = None
+        if runs and all(r["loop"]["samples"] >= n for r in runs.values()):
+            return True
+        time.sleep(0.5)
+    return False
+
+
+# ── Clients ──
+class Recorder:
+    def __init__(self):
+        self.latency   = {}
+        self.errors    = {}
+        self.staleness = []
+        self.lock      = threading.Lock()
+
+    def timed(self, label, fn):
+        start = time.perf_counter()
+        try:
+            r = fn()
+            ok = r.ok
+        except requests.RequestException:
+            r, ok = None, False
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.latency.setdefault(label, []).append(elapsed)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+        return r
+
+
+def poller(http, base, rec, stop, args, n):
+    # Mostly /status like the dashboard; every so often a full page load and a start retry
+    i = n
+    while not stop.is_set():
+        i += 1
+        r = rec.timed("GET /status", lambda: http.get(f"{base}/status", timeout=10))
+        if r is not None and r.ok:
+            ts = r.json().get("ts")
+            if ts:
+                with rec.lock:
+                    rec.staleness.append((time.time() - ts) * 1000)
+        if i % args.page_every == 0:
+            rec.timed("GET /", lambda: http.get(f"{base}/", timeout=10))
+            rec.timed("GET /auth-status", lambda: http.get(f"{base}/auth-status", timeout=10))
+        if i % args.start_every == 0:
+            underlying = args.underlyings[i % len(args.underlyings)]
+            rec.timed("POST /start", lambda: http.post(
+                f"{base}/start", json=algo_config(underlying, args), timeout=10))
+        if args.think_ms:
+            stop.wait(args.think_ms / 1000)
+
+
+def churner(http, base, rec, stop, args):
+    while not stop.is_set():
+        for underlying in args.underlyings:
+            rec.timed("POST /start", lambda: http.post(
+                f"{base}/start", json=algo_config(underlying, args), timeout=10))
+        stop.wait(args.churn_hold)
+        rec.timed("POST /stop", lambda: http.post(f"{base}/stop", timeout=10))
+        stop.wait(0.2)
+
+
+def run_load(accounts, churn_accounts, base, args):
+    rec, stop = Recorder(), threading.Event()
+    threads = []
+    for n in range(args.clients):
+        http = requests.Session()
+        http.cookies.update(accounts[n % len(accounts)].cookies)
+        threads.append(threading.Thread(target=poller, args=(http, base, rec, stop, args, n), daemon=True))
+    for http in churn_accounts:
+        threads.append(threading.Thread(target=churner, args=(http, base, rec, stop, args), daemon=True))
+    started = time.time()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    # Keep the load on until the loaded runs have enough samples too
+    wait_for_samples(accounts, base, args.min_samples, timeout=phase_timeout(args))
+    stop.set()
+    elapsed = time.time() - started
+    for t in threads:
+        t.join(timeout=15)
+    return rec, elapsed
+
+
+# ── Report ──
+def phase_timeout(args):
+    return max(60.0, 3 * args.min_samples * args.poll_interval)
+
+
+def summarize_loops(runs):
+    return {
+        name: {"iterations": r["loop"]["iterations"], "samples": r["loop"]["samples"],
+               "p50_ms": r["loop"]["p50_ms"],
+               "p99_ms": r["loop"]["p99_ms"], "max_ms": r["loop"]["max_ms"],
+               "work_p99_ms": r["loop"]["work_p99_ms"],
+               "stage_wait_p99_ms": {k: v["wait_ms_p99"] for k, v in (r.get("pipeline") or {}).items()}}
+        for name, r in runs.items()
+    }
+
+
+def worst(loops, key):
+    values = [l[key] for l in loops.values() if l[key] is not None]
+    return max(values) if values else None
+
+
+def print_report(result, args):
+    print(f"\n── Endpoints ({args.clients} clients, {args.churn} churn, {result['load_seconds']:.0f}s) ──")
+    print(f"{'endpoint':<18}{'count':>8}{'err':>6}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>9}")
+    for label, s in sorted(result["endpoints"].items()):
+        print(f"{label:<18}{s['count']:>8}{s['errors']:>6}{s['p50_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+              f"{s['max_ms']:>10.2f}{s['rps']:>9.1f}")
+    st = result["staleness_ms"]
+    if st["p50"] is not None:
+        print(f"snapshot staleness: p50 {st['p50']:.1f} ms | p99 {st['p99']:.1f} ms")
+
+    print("\n── Engine feed loop (busy time per iteration) ──")
+    print(f"{'run':<22}{'phase':<10}{'iters':>7}{'samples':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+          f"{'work p99':>10}")
+    for phase in ("baseline", "load"):
+        for name, l in sorted(result["loop"][phase].items()):
+            print(f"{name:<22}{phase:<10}{l['iterations']:>7}{l['samples']:>9}{l['p50_ms'] or 0:>10.2f}"
+                  f"{l['p99_ms'] or 0:>10.2f}{l['max_ms'] or 0:>10.2f}{l['work_p99_ms'] or 0:>10.2f}")
+    print(f"\nworst loop p99: baseline {result['loop_p99_ms']['baseline']} ms | "
+          f"load {result['loop_p99_ms']['load']} ms")
+    print(f"worst work p99: baseline {result['work_p99_ms']['baseline']} ms | "
+          f"load {result['work_p99_ms']['load']} ms | allowed increase {args.loop_delta_ms} ms")
+    for failure in result["failures"]:
+        print(f"FAIL: {failure}")
+    if not result["failures"]:
+        print("PASS")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--clients", type=int, default=50, help="concurrent pollers / browser tabs")
+    p.add_argument("--accounts", type=int, default=2, help="logged-in accounts the pollers share")
+    p.add_argument("--churn", type=int, default=1, help="clients cycling /start and /stop on their own accounts")
+    p.add_argument("--churn-hold", type=float, default=2.0, help="seconds a churned run stays up")
+    p.add_argument("--underlyings", default="SENSEX,NIFTY", help="comma separated, one run each per account")
+    p.add_argument("--exit-mode", default="poll", choices=("poll", "exchange", "gtt"))
+    p.add_argument("--duration", type=float, default=20, help="minimum seconds of load")
+    p.add_argument("--baseline", type=float, default=20, help="minimum seconds of engine-only baseline")
+    p.add_argument("--min-samples", type=int, default=200,
+                   help="loop samples each run needs per phase (p99 of fewer than 100 is the max)")
+    p.add_argument("--think-ms", type=float, default=0, help="pause between a client's requests (0 = back to back)")
+    p.add_argument("--page-every", type=int, default=20, help="load the dashboard every N polls")
+    p.add_argument("--start-every", type=int, default=50, help="retry /start every N polls")
+    p.add_argument("--poll-interval", type=float, default=0.1, help="engine POLL_INTERVAL")
+    p.add_argument("--kite-latency-ms", type=float, default=20, help="fake Kite round trip")
+    p.add_argument("--loop-delta-ms", type=float, default=100,
+                   help="max increase of the worst p99 feed-loop work (rate-limit waits excluded) under load")
+    p.add_argument("--loop-budget-ms", type=float, default=None, help="optional max p99 feed-loop latency under load")
+    p.add_argument("--endpoint-budget-ms", type=float, default=None, help="optional max p99 per endpoint")
+    p.add_argument("--server-logs", action="store_true", help="show the API/engine console output")
+    p.add_argument("--json", dest="json_path", help="also write the result as JSON here")
+    args = p.parse_args(argv)
+    args.underlyings = [u.strip().upper() for u in args.underlyings.split(",") if u.strip()]
+    unknown = [u for u in args.underlyings if u not in UNDERLYINGS]
+    if unknown:
+        p.error(f"unknown underlying(s) {', '.join(unknown)}; use {', '.join(UNDERLYINGS)}")
+    return args
+
+
+def run_phases(args, workdir, out):
+    """Baseline then load; fills `out` as each phase completes, so a failure
+    part way through still leaves whatever was measured for the report."""
+    proc, base = start_server(free_port(), workdir, args)
+    try:
+        accounts = [login(base, f"load{i}") for i in range(args.accounts)]
+        churn_accounts = [login(base, f"churn{i}") for i in range(args.churn)]
+        for http in accounts:
+            start_all(http, base, args)
+
+        print(f"Baseline: {args.baseline:.0f}s+, engine only, until {args.min_samples} loop samples per run ...")
+        time.sleep(args.baseline)
+        wait_for_samples(accounts, base, args.min_samples, timeout=phase_timeout(args))
+        out["baseline"] = summarize_loops(loop_samples(accounts, base))
+
+        for http in accounts:
+            restart_all(http, base, args)
+        # Start the clock once the new runs are past their warm-up
+        wait_for_samples(accounts, base, 1, timeout=30)
+        print(f"Load: {args.clients} clients for {args.duration:.0f}s+ ...")
+        out["rec"], out["load_seconds"] = run_load(accounts, churn_accounts, base, args)
+        out["load"] = summarize_loops(loop_samples(accounts, base))
+    finally:
+        stop_server(proc)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="algo-loadtest-")
+    out = {"baseline": {}, "load": {}, "rec": Recorder(), "load_seconds": 0.0}
+    failures = []
+    try:
+        run_phases(args, workdir, out)
+    except (requests.RequestException, RuntimeError) as e:
+        failures.append(f"harness aborted: {type(e).__name__}: {e}")
+    baseline, loaded, rec, load_seconds = out["baseline"], out["load"], out["rec"], out["load_seconds"]
+
+    endpoints = {
+        label: {
+            "count":  len(v),
+            "errors": rec.errors.get(label, 0),
+            "p50_ms": percentile(v, 0.50),
+            "p99_ms": percentile(v, 0.99),
+            "max_ms": max(v),
+            "rps":    len(v) / max(load_seconds, 1e-9),
+        }
+        for label, v in rec.latency.items()
+    }
+    result = {
+        "endpoints":    endpoints,
+        "staleness_ms": {"p50": percentile(rec.staleness, 0.50), "p99": percentile(rec.staleness, 0.99)},
+        "loop":         {"baseline": baseline, "load": loaded},
+        "loop_p99_ms":  {"baseline": worst(baseline, "p99_ms"), "load": worst(loaded, "p99_ms")},
+        "work_p99_ms":  {"baseline": worst(baseline, "work_p99_ms"), "load": worst(loaded, "work_p99_ms")},
+        "load_seconds": load_seconds,
+        "failures":     failures,
+    }
+
+    for phase, loops in (("baseline", baseline), ("load", loaded)):
+        for name, l in sorted(loops.items()):
+            if l["samples"] < args.min_samples:
+                result["failures"].append(
+                    f"{name} {phase}: {l['samples']} loop samples < --min-samples {args.min_samples}")
+    base_work, load_work = result["work_p99_ms"]["baseline"], result["work_p99_ms"]["load"]
+    load_p99 = result["loop_p99_ms"]["load"]
+    if base_work is None or load_work is None:
+        result["failures"].append("no engine loop samples")
+    else:
+        if load_work - base_work > args.loop_delta_ms:
+            result["failures"].append(
+                f"engine loop work p99 {load_work:.1f} ms under load is {load_work - base_work:.1f} ms over "
+                f"baseline {base_work:.1f} ms (allowed {args.loop_delta_ms} ms)")
+        if args.loop_budget_ms is not None and load_p99 > args.loop_budget_ms:
+            result["failures"].append(f"engine loop p99 {load_p99:.1f} ms > budget {args.loop_budget_ms} ms")
+    if args.endpoint_budget_ms is not None:
+        for label, s in endpoints.items():
+            if s["p99_ms"] > args.endpoint_budget_ms:
+                result["failures"].append(
+                    f"{label} p99 {s['p99_ms']:.1f} ms > budget {args.endpoint_budget_ms} ms")
+
+    print_report(result, args)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+    return 1 if result["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
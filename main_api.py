@@ -1,22 +1,22 @@
 # main_api.py
+from typing import Optional
 import time
-import threading
-import pandas as pd
-from datetime import datetime
-import pytz
 import os
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends, Cookie
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
 from pydantic import BaseModel
 
-from indicators import add_ema
-from strategy import bullish_crossover
-from data import get_candles_zk
-from utils import resolve_ce_pe_by_strikes
-from zerodha_client import get_kite
-from kiteconnect import KiteConnect
+from zerodha_client import get_kite, new_client, save_access_token, load_access_token
+from sessions import (
+    Session, SESSION_COOKIE, new_state, new_run_state, get_session, session_for_user, drop_session, all_sessions,
+)
+from engine_client import EngineClient
+from journal import read_aggregates
+from exits import EXIT_MODES
+from profiler import MIN_INTERVAL
+from instruments import UNDERLYINGS, EXPIRY_KINDS
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,23 +24,14 @@ load_dotenv()
 API_KEY    = os.getenv("API_KEY")
 API_SECRET = os.getenv("API_SECRET")
 
-IST = pytz.timezone("Asia/Kolkata")
-
-# ── Global State ──
-algo_state = {
-    "running": False, "call_entry": None, "put_entry": None,
-    "call_symbol": None, "put_symbol": None, "qty": None,
-    "profit_points": None, "stoploss_points": None,
-    "expiry": None, "logs": [], "pnl": 0.0,
-    "access_token": None, "dry_run": True,
-    "logged_in": False, "user_name": None,
-}
+# Only used for the login URL and request-token exchange
+auth_kite = new_client()
 
-algo_thread = None
-stop_flag   = threading.Event()
+# ── Models ──
+class ProfileConfig(BaseModel):
+    interval_ms: float = 10
 
 
-# ── Model ──
 class AlgoConfig(BaseModel):
     call_strike:     int
     put_strike:      int
@@ -49,201 +40,60 @@ class AlgoConfig(BaseModel):
     stoploss_points: int
     timeframe:       str
     dry_run:         bool = True
+    exit_mode:       str  = "poll"   # "poll" | "exchange" (SL-M + target LIMIT) | "gtt" (OCO)
+    underlying:      str  = "SENSEX" # SENSEX / BANKEX (BFO), NIFTY / BANKNIFTY (NFO)
+    expiry:          str  = "weekly" # "weekly" | "monthly"
+    expiry_index:    int  = 0        # 0 = nearest, 1 = next
+
+
+# ── Engine Process ──
+def register_sessions():
+    # Re-announce every logged-in session to a freshly (re)started engine
+    for session in all_sessions():
+        if session.state["logged_in"]:
+            engine_login(session)
+
+def engine_login(session: Session):
+    return engine.call(
+        "login",
+        sid=session.sid,
+        user_id=session.state["user_id"],
+        user_name=session.state["user_name"],
+        access_token=session.state["access_token"],
+    )
+
+def adopt_sessions():
+    # An engine that outlived the previous API process is still trading these
+    # accounts; take over its session ids so existing cookies keep working
+    sessions = engine.call("sessions")
+    if not isinstance(sessions, list):
+        return
+    for info in sessions:
+        # Tokens are saved at login, so they are read back here rather than sent
+        access_token = load_access_token(info["user_id"])
+        session = session_for_user(info["user_id"], sid=info["sid"])
+        session.state["user_name"]    = info["user_name"]
+        session.state["access_token"] = access_token
+        session.state["logged_in"]    = info["logged_in"] and access_token is not None
+    print(f"[ENGINE] adopted {len(sessions)} session(s) from the running engine")
 
+engine = EngineClient(on_restart=register_sessions)
 
-# ── Helpers ──
-def log(msg: str):
-    timestamp = datetime.now(IST).strftime("%d-%m-%Y %H:%M:%S")
-    entry = f"[{timestamp}] {msg}"
-    algo_state["logs"].append(entry)
-    print(entry)
-
-def is_market_open():
-    now = datetime.now(IST)
-    if now.weekday() >= 5:
-        return False
-    market_open  = now.replace(hour=9,  minute=15, second=0, microsecond=0)
-    market_close = now.replace(hour=15, minute=30, second=0, microsecond=0)
-    return market_open <= now <= market_close
-
-def is_eod():
-    now = datetime.now(IST)
-    return now >= now.replace(hour=15, minute=20, second=0, microsecond=0)
-
-def place_order(kite, symbol, qty, transaction_type):
-    action = "BUY" if transaction_type == kite.TRANSACTION_TYPE_BUY else "SELL"
-    if algo_state["dry_run"]:
-        log(f"[DRY RUN] {action} {qty} x {symbol}")
-        return "DRY_RUN"
-    try:
-        order_id = kite.place_order(
-            variety=kite.VARIETY_REGULAR,
-            exchange=kite.EXCHANGE_BFO,
-            tradingsymbol=symbol,
-            transaction_type=transaction_type,
-            quantity=qty,
-            product=kite.PRODUCT_MIS,
-            order_type=kite.ORDER_TYPE_MARKET,
-        )
-        log(f"[ORDER PLACED] {action} {qty} x {symbol} | ID: {order_id}")
-        return order_id
-    except Exception as e:
-        log(f"[ORDER FAILED] {action} {symbol} | Error: {e}")
-        return None
-
-
-# ── Algo Thread ──
-def run_algo(config: AlgoConfig):
-    TF_MAP   = {"1m":"minute", "3m": "3minute", "5m": "5minute", "15m": "15minute"}
-    ZK_TF    = TF_MAP[config.timeframe]
-    LOT_SIZE = 20
-    QTY      = config.lots * LOT_SIZE
 
-    try:
-        kite = get_kite()
-    except Exception as e:
-        log(f"[ERROR] Login failed: {e}")
-        algo_state["running"] = False
-        return
+# ── FastAPI App ──
+app = FastAPI()
 
-    try:
-        CALL_SYMBOL, PUT_SYMBOL, CE_TOKEN, PE_TOKEN, EXPIRY = resolve_ce_pe_by_strikes(
-            kite, config.call_strike, config.put_strike
-        )
-    except Exception as e:
-        log(f"[ERROR] Failed to resolve contracts: {e}")
-        algo_state["running"] = False
-        return
 
-    algo_state["call_symbol"]     = CALL_SYMBOL
-    algo_state["put_symbol"]      = PUT_SYMBOL
-    algo_state["qty"]             = QTY
-    algo_state["profit_points"]   = config.profit_points
-    algo_state["stoploss_points"] = config.stoploss_points
-    algo_state["expiry"]          = str(EXPIRY)
-
-    mode = "DRY RUN" if config.dry_run else "LIVE"
-    log(f"Logged in as {algo_state['user_name']} | Algo started | Mode: {mode} | CE: {CALL_SYMBOL} | PE: {PUT_SYMBOL} | Qty: {QTY} | Expiry: {EXPIRY}")
-
-    init_candles = get_candles_zk(kite, CE_TOKEN, ZK_TF)
-    last_seen_candle_time = pd.DataFrame(init_candles).iloc[-1]["date"] if init_candles else None
-
-    call_entry = None
-    put_entry  = None
-
-    while not stop_flag.is_set():
-        try:
-            if not is_market_open():
-                time.sleep(60)
-                continue
-
-            ce_candles = get_candles_zk(kite, CE_TOKEN, ZK_TF)
-            pe_candles = get_candles_zk(kite, PE_TOKEN, ZK_TF)
-
-            if not ce_candles or not pe_candles:
-                time.sleep(60)
-                continue
-
-            ce_df = add_ema(pd.DataFrame(ce_candles))
-            pe_df = add_ema(pd.DataFrame(pe_candles))
-
-            current_candle_time = ce_df.iloc[-1]["date"]
-
-            if current_candle_time == last_seen_candle_time:
-                time.sleep(10)
-                continue
-
-            last_seen_candle_time = current_candle_time
-
-            ce_signal = bullish_crossover(ce_df)
-            pe_signal = bullish_crossover(pe_df)
-
-            if ce_signal and call_entry is None:
-                place_order(kite, CALL_SYMBOL, QTY, kite.TRANSACTION_TYPE_BUY)
-                call_entry = ce_df.iloc[-2]["close"]
-                algo_state["call_entry"] = call_entry
-                log(f"[BUY - CE] {CALL_SYMBOL} | Qty: {QTY} | Price: ₹{call_entry}")
-
-            if pe_signal and put_entry is None:
-                place_order(kite, PUT_SYMBOL, QTY, kite.TRANSACTION_TYPE_BUY)
-                put_entry = pe_df.iloc[-2]["close"]
-                algo_state["put_entry"] = put_entry
-                log(f"[BUY - PE] {PUT_SYMBOL} | Qty: {QTY} | Price: ₹{put_entry}")
-
-            while not stop_flag.is_set():
-                if not is_market_open():
-                    break
-
-                if is_eod():
-                    if call_entry is not None:
-                        eod_ltp = kite.ltp(f"BFO:{CALL_SYMBOL}")[f"BFO:{CALL_SYMBOL}"]["last_price"]
-                        place_order(kite, CALL_SYMBOL, QTY, kite.TRANSACTION_TYPE_SELL)
-                        pnl = (eod_ltp - call_entry) * QTY
-                        algo_state["pnl"] += pnl
-                        log(f"[SELL - EOD] {CALL_SYMBOL} | Price: ₹{eod_ltp} | PnL: ₹{pnl:.2f}")
-                        call_entry = None
-                        algo_state["call_entry"] = None
-                    if put_entry is not None:
-                        eod_ltp = kite.ltp(f"BFO:{PUT_SYMBOL}")[f"BFO:{PUT_SYMBOL}"]["last_price"]
-                        place_order(kite, PUT_SYMBOL, QTY, kite.TRANSACTION_TYPE_SELL)
-                        pnl = (eod_ltp - put_entry) * QTY
-                        algo_state["pnl"] += pnl
-                        log(f"[SELL - EOD] {PUT_SYMBOL} | Price: ₹{eod_ltp} | PnL: ₹{pnl:.2f}")
-                        put_entry = None
-                        algo_state["put_entry"] = None
-                    break
-
-                if call_entry is not None:
-                    call_ltp = kite.ltp(f"BFO:{CALL_SYMBOL}")[f"BFO:{CALL_SYMBOL}"]["last_price"]
-                    if call_ltp >= call_entry + config.profit_points:
-                        place_order(kite, CALL_SYMBOL, QTY, kite.TRANSACTION_TYPE_SELL)
-                        pnl = (call_ltp - call_entry) * QTY
-                        algo_state["pnl"] += pnl
-                        log(f"[SELL - TARGET] {CALL_SYMBOL} | Price: ₹{call_ltp} | PnL: ₹{pnl:.2f}")
-                        call_entry = None
-                        algo_state["call_entry"] = None
-                    elif call_ltp <= call_entry - config.stoploss_points:
-                        place_order(kite, CALL_SYMBOL, QTY, kite.TRANSACTION_TYPE_SELL)
-                        pnl = (call_ltp - call_entry) * QTY
-                        algo_state["pnl"] += pnl
-                        log(f"[SELL - STOPLOSS] {CALL_SYMBOL} | Price: ₹{call_ltp} | PnL: ₹{pnl:.2f}")
-                        call_entry = None
-                        algo_state["call_entry"] = None
-
-                if put_entry is not None:
-                    put_ltp = kite.ltp(f"BFO:{PUT_SYMBOL}")[f"BFO:{PUT_SYMBOL}"]["last_price"]
-                    if put_ltp >= put_entry + config.profit_points:
-                        place_order(kite, PUT_SYMBOL, QTY, kite.TRANSACTION_TYPE_SELL)
-                        pnl = (put_ltp - put_entry) * QTY
-                        algo_state["pnl"] += pnl
-                        log(f"[SELL - TARGET] {PUT_SYMBOL} | Price: ₹{put_ltp} | PnL: ₹{pnl:.2f}")
-                        put_entry = None
-                        algo_state["put_entry"] = None
-                    elif put_ltp <= put_entry - config.stoploss_points:
-                        place_order(kite, PUT_SYMBOL, QTY, kite.TRANSACTION_TYPE_SELL)
-                        pnl = (put_ltp - put_entry) * QTY
-                        algo_state["pnl"] += pnl
-                        log(f"[SELL - STOPLOSS] {PUT_SYMBOL} | Price: ₹{put_ltp} | PnL: ₹{pnl:.2f}")
-                        put_entry = None
-                        algo_state["put_entry"] = None
-
-                ce_candles_check = get_candles_zk(kite, CE_TOKEN, ZK_TF)
-                if ce_candles_check:
-                    new_time = pd.DataFrame(ce_candles_check).iloc[-1]["date"]
-                    if new_time != last_seen_candle_time:
-                        break
-
-                time.sleep(2)
-
-        except Exception as e:
-            log(f"[ERROR] {e}")
-            time.sleep(10)
-
-    algo_state["running"] = False
+@app.on_event("startup")
+def start_engine():
+    engine.start()
+    if engine.attached:
+        adopt_sessions()
 
 
-# ── FastAPI App ──
-app = FastAPI()
+@app.on_event("shutdown")
+def stop_engine():
+    engine.shutdown()
 
 app.add_middleware(
     CORSMiddleware,
@@ -263,8 +113,12 @@ def root():
 # ── Get Zerodha login URL ──
 @app.get("/zerodha-login-url")
 def zerodha_login_url():
-    kite = KiteConnect(api_key=API_KEY)
-    return {"url": kite.login_url()}
+    return {"url": auth_kite.login_url()}
+
+
+# ── Session lookup ──
+def current_session(sid: Optional[str] = Cookie(None, alias=SESSION_COOKIE)):
+    return get_session(sid)
 
 
 # ── Zerodha OAuth callback ──
@@ -284,21 +138,23 @@ def zerodha_callback(request: Request):
         """)
 
     try:
-        kite = KiteConnect(api_key=API_KEY)
-        session_data = kite.generate_session(request_token, api_secret=API_SECRET)
+        session_data = auth_kite.generate_session(request_token, api_secret=API_SECRET)
         access_token = session_data["access_token"]
+        user_id      = session_data["user_id"]
 
-        with open("access_token.txt", "w") as f:
-            f.write(access_token)
+        save_access_token(access_token, user_id)
 
-        algo_state["access_token"] = access_token
-        algo_state["logged_in"]    = True
+        session = session_for_user(user_id)
+        session.state["access_token"] = access_token
+        session.state["logged_in"]    = True
 
-        kite.set_access_token(access_token)
-        profile = kite.profile()
-        algo_state["user_name"] = profile["user_name"]
+        profile = get_kite(access_token, user_id).profile()
+        session.state["user_name"] = profile["user_name"]
+        engine_login(session)
 
-        return RedirectResponse(url="/")
+        response = RedirectResponse(url="/")
+        response.set_cookie(SESSION_COOKIE, session.sid, httponly=True, samesite="lax")
+        return response
 
     except Exception as e:
         return HTMLResponse(f"""
@@ -313,75 +169,136 @@ def zerodha_callback(request: Request):
 
 # ── Auth status ──
 @app.get("/auth-status")
-def auth_status():
+def auth_status(session: Optional[Session] = Depends(current_session)):
+    if session is None:
+        return {"logged_in": False, "user_name": None}
     return {
-        "logged_in": algo_state["logged_in"],
-        "user_name": algo_state["user_name"],
+        "logged_in": session.state["logged_in"],
+        "user_name": session.state["user_name"],
     }
 
 
 # ── Logout ──
 @app.post("/logout")
-def logout():
-    stop_flag.set()
-    log("User logged out. Algo stopped.")
-    algo_state["running"]      = False
-    algo_state["logged_in"]    = False
-    algo_state["user_name"]    = None
-    algo_state["access_token"] = None
-    algo_state["logs"]         = []
-    algo_state["pnl"]          = 0.0
-    algo_state["call_entry"]   = None
-    algo_state["put_entry"]    = None
+def logout(session: Optional[Session] = Depends(current_session)):
+    if session is None:
+        return {"status": "logged out"}
+    engine.call("logout", sid=session.sid)
+    session.state["logged_in"]    = False
+    session.state["user_name"]    = None
+    session.state["access_token"] = None
+    drop_session(session.sid)
+    engine.snapshots.pop(session.sid, None)
     return {"status": "logged out"}
 
 
 # ── Start algo ──
 @app.post("/start")
-def start_algo(config: AlgoConfig):
-    global algo_thread, stop_flag
-
-    if not algo_state["logged_in"]:
+def start_algo(config: AlgoConfig, session: Optional[Session] = Depends(current_session)):
+    if session is None or not session.state["logged_in"]:
         return {"status": "error", "message": "Please login with Zerodha first."}
-
-    if algo_state["running"]:
-        return {"status": "already running"}
-
-    algo_state["dry_run"]    = config.dry_run
-    stop_flag                = threading.Event()
-    algo_state["running"]    = True
-    algo_state["logs"]       = []
-    algo_state["pnl"]        = 0.0
-    algo_state["call_entry"] = None
-    algo_state["put_entry"]  = None
-
-    algo_thread = threading.Thread(target=run_algo, args=(config,), daemon=True)
-    algo_thread.start()
-    return {"status": "started"}
+    if config.exit_mode not in EXIT_MODES:
+        return {"status": "error", "message": f"exit_mode must be one of {', '.join(EXIT_MODES)}."}
+    if config.underlying not in UNDERLYINGS:
+        return {"status": "error", "message": f"underlying must be one of {', '.join(UNDERLYINGS)}."}
+    if config.expiry not in EXPIRY_KINDS or config.expiry_index < 0:
+        return {"status": "error", "message": f"expiry must be one of {', '.join(EXPIRY_KINDS)} with expiry_index >= 0."}
+    return engine.call("start", sid=session.sid, config=config.dict())
 
 
 # ── Stop algo ──
+# Stops every underlying unless one is named, e.g. /stop?underlying=NIFTY
 @app.post("/stop")
-def stop_algo():
-    stop_flag.set()
-    algo_state["running"] = False
+def stop_algo(underlying: Optional[str] = None, session: Optional[Session] = Depends(current_session)):
+    if session is not None:
+        engine.call("stop", sid=session.sid, underlying=underlying)
     return {"status": "stopping"}
 
 
 # ── Status ──
 @app.get("/status")
-def get_status():
+def get_status(session: Optional[Session] = Depends(current_session)):
+    snap = engine.snapshot(session.sid) if session is not None else None
+    if snap is not None:
+        return snap
+    algo_state = dict(new_run_state(), logs=new_state()["logs"])
     return {
         "running":         algo_state["running"],
+        "underlying":      algo_state["underlying"],
+        "exchange":        algo_state["exchange"],
         "call_symbol":     algo_state["call_symbol"],
         "put_symbol":      algo_state["put_symbol"],
         "call_entry":      algo_state["call_entry"],
         "put_entry":       algo_state["put_entry"],
         "qty":             algo_state["qty"],
+        "lot_size":        algo_state["lot_size"],
         "profit_points":   algo_state["profit_points"],
         "stoploss_points": algo_state["stoploss_points"],
         "expiry":          algo_state["expiry"],
         "pnl":             algo_state["pnl"],
         "dry_run":         algo_state["dry_run"],
-        "logs":            algo_state["logs"][-50:],
+        "logs":            algo_state["logs"],
+        "strategies":      {},
     }
+
+
+# ── Analytics ──
+@app.get("/analytics")
+def get_analytics(session: Optional[Session] = Depends(current_session)):
+    if session is None or not session.state["logged_in"]:
+        return {"status": "error", "message": "Please login with Zerodha first."}
+    return read_aggregates(session.state["user_id"])
+
+
+# ── Profiling ──
+# Engine-wide sampling profiler; export writes files in the engine and serves them here.
+# There is one profiler for the whole engine: any logged-in user starting or stopping
+# it does so for every account, while exports only ever contain the caller's runs.
+@app.post("/profiling/start")
+def profiling_start(config: ProfileConfig, session: Optional[Session] = Depends(current_session)):
+    """Start sampling the engine, for all accounts, every `interval_ms` (at least 1 ms)."""
+    if session is None or not session.state["logged_in"]:
+        return {"status": "error", "message": "Please login with Zerodha first."}
+    if not config.interval_ms >= MIN_INTERVAL * 1000:
+        return {"status": "error", "message": f"interval_ms must be at least {MIN_INTERVAL * 1000:g}."}
+    return engine.call("profile_start", interval_ms=config.interval_ms)
+
+
+@app.post("/profiling/stop")
+def profiling_stop(session: Optional[Session] = Depends(current_session)):
+    """Stop sampling the engine, for all accounts; recorded data stays exportable."""
+    if session is None or not session.state["logged_in"]:
+        return {"status": "error", "message": "Please login with Zerodha first."}
+    return engine.call("profile_stop")
+
+
+@app.get("/profiling/status")
+def profiling_status(session: Optional[Session] = Depends(current_session)):
+    if session is None or not session.state["logged_in"]:
+        return {"status": "error", "message": "Please login with Zerodha first."}
+    return engine.call("profile_status")
+
+
+@app.get("/profiling/export")
+def profiling_export(
+    fmt: str = "chrome",
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    seconds: Optional[float] = None,
+    session: Optional[Session] = Depends(current_session),
+):
+    """Export a time window as `chrome` (Trace Event JSON) or `folded` (flamegraph stacks).
+    The window is `since`..`until` in epoch seconds, or the last `seconds`. Only the
+    caller's own runs are included."""
+    if session is None or not session.state["logged_in"]:
+        return {"status": "error", "message": "Please login with Zerodha first."}
+    if fmt not in ("chrome", "folded"):
+        return {"status": "error", "message": "fmt must be 'chrome' or 'folded'."}
+    if seconds:
+        until = time.time()
+        since = until - seconds
+
+    paths = engine.call("profile_export", timeout=60, since=since, until=until, user=session.state["user_id"])
+    if fmt not in paths:
+        return paths
+    return FileResponse(paths[fmt], filename=os.path.basename(paths[fmt]))
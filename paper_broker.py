@@ -0,0 +1,187 @@
+# paper_broker.py
+import itertools
+import threading
+from datetime import datetime
+import pytz
+from kiteconnect import KiteConnect
+from kiteconnect.exceptions import InputException
+
+from data import get_ltp
+
+IST = pytz.timezone("Asia/Kolkata")
+
+
+class PaperBroker:
+    """Local stand-in for the order side of KiteConnect.
+
+    Market data calls (ltp, historical_data, instruments, profile, ...) and the
+    KiteConnect constants are delegated to `market`; orders and GTTs are kept in
+    memory and matched against LTP whenever orders()/get_gtt() is polled. Used
+    for dry runs.
+
+    Positions are tracked per (exchange, symbol, product). The algo only buys
+    options, so a sell must close a long of the same product: one that does
+    not is rejected, and a GTT without a matching position is refused, the
+    way a product mismatch between entry and exits would surface live.
+    """
+
+    def __init__(self, market):
+        self.market     = market
+        self._orders    = {}
+        self._gtts      = {}
+        self._positions = {}   # (exchange, symbol, product) → net quantity
+        self._ids    = itertools.count(1)
+        self._lock   = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.market, name)
+
+    # ── Helpers ──
+    def _ltp(self, exchange, symbol):
+        # Through the shared quote cache, so matching costs no extra rate-limited calls
+        return get_ltp(self.market, exchange, symbol)
+
+    def _position(self, exchange, symbol, product):
+        return self._positions.get((exchange, symbol, product), 0)
+
+    def _reject(self, order, message):
+        order["status"]         = KiteConnect.STATUS_REJECTED
+        order["status_message"] = message
+
+    def _fill(self, order, price):
+        key  = (order["exchange"], order["tradingsymbol"], order["product"])
+        sign = 1 if order["transaction_type"] == KiteConnect.TRANSACTION_TYPE_BUY else -1
+        if sign < 0 and self._positions.get(key, 0) < order["quantity"]:
+            self._reject(order, f"No open {order['product']} position to sell")
+            return
+        self._positions[key] = self._positions.get(key, 0) + sign * order["quantity"]
+        order["status"]          = KiteConnect.STATUS_COMPLETE
+        order["average_price"]   = price
+        order["filled_quantity"] = order["quantity"]
+        order["exchange_update_timestamp"] = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _match(self, order, ltp):
+        side_sell = order["transaction_type"] == KiteConnect.TRANSACTION_TYPE_SELL
+        kind      = order["order_type"]
+        if kind == KiteConnect.ORDER_TYPE_MARKET:
+            self._fill(order, ltp)
+        elif kind == KiteConnect.ORDER_TYPE_LIMIT:
+            if (side_sell and ltp >= order["price"]) or (not side_sell and ltp <= order["price"]):
+                self._fill(order, ltp)
+        elif kind == KiteConnect.ORDER_TYPE_SLM:
+            trigger = order["trigger_price"]
+            if (side_sell and ltp <= trigger) or (not side_sell and ltp >= trigger):
+                self._fill(order, ltp)
+
+    # ── Orders ──
+    def place_order(self, variety, exchange, tradingsymbol, transaction_type, quantity, product,
+                    order_type, price=None, trigger_price=None, **kwargs):
+        order_id = f"PAPER{next(self._ids)}"
+        order = {
+            "order_id": order_id, "variety": variety, "exchange": exchange,
+            "tradingsymbol": tradingsymbol, "transaction_type": transaction_type,
+            "quantity": quantity, "product": product, "order_type": order_type,
+            "price": price or 0, "trigger_price": trigger_price or 0,
+            "status": "TRIGGER PENDING" if order_type == KiteConnect.ORDER_TYPE_SLM else "OPEN",
+            "average_price": 0, "filled_quantity": 0, "status_message": None,
+        }
+        with self._lock:
+            self._orders[order_id] = order
+            if (transaction_type == KiteConnect.TRANSACTION_TYPE_SELL
+                    and self._position(exchange, tradingsymbol, product) < quantity):
+                self._reject(order, f"No open {product} position to sell")
+                return order_id
+        if order_type == KiteConnect.ORDER_TYPE_MARKET:
+            ltp = self._ltp(exchange, tradingsymbol)
+            with self._lock:
+                self._match(order, ltp)
+        return order_id
+
+    def cancel_order(self, variety, order_id, parent_order_id=None):
+        with self._lock:
+            order = self._orders[order_id]
+            if order["status"] in ("OPEN", "TRIGGER PENDING"):
+                order["status"] = KiteConnect.STATUS_CANCELLED
+        return order_id
+
+    def modify_order(self, variety, order_id, parent_order_id=None, quantity=None, price=None,
+                     order_type=None, trigger_price=None, **kwargs):
+        with self._lock:
+            order = self._orders[order_id]
+            if order["status"] not in ("OPEN", "TRIGGER PENDING"):
+                raise InputException(f"Order {order_id} is {order['status']} and cannot be modified")
+            for field, value in (("quantity", quantity), ("price", price),
+                                 ("order_type", order_type), ("trigger_price", trigger_price)):
+                if value is not None:
+                    order[field] = value
+            if order_type is not None:
+                order["status"] = "TRIGGER PENDING" if order_type == KiteConnect.ORDER_TYPE_SLM else "OPEN"
+        # Matched on the next orders() poll
+        return order_id
+
+    def orders(self):
+        with self._lock:
+            pending = [o for o in self._orders.values() if o["status"] in ("OPEN", "TRIGGER PENDING")]
+        prices = {}
+        for order in pending:
+            key = (order["exchange"], order["tradingsymbol"])
+            if key not in prices:
+                prices[key] = self._ltp(*key)
+            with self._lock:
+                if order["status"] in ("OPEN", "TRIGGER PENDING"):
+                    self._match(order, prices[key])
+        with self._lock:
+            return [dict(o) for o in self._orders.values()]
+
+    def order_history(self, order_id):
+        return [o for o in self.orders() if o["order_id"] == order_id]
+
+    # ── GTT ──
+    def place_gtt(self, trigger_type, tradingsymbol, exchange, trigger_values, last_price, orders):
+        trigger_id = next(self._ids)
+        with self._lock:
+            for o in orders:
+                if (o["transaction_type"] == KiteConnect.TRANSACTION_TYPE_SELL
+                        and self._position(exchange, tradingsymbol, o["product"]) < o["quantity"]):
+                    raise InputException(f"No open {o['product']} position in {tradingsymbol} for this GTT")
+            self._gtts[trigger_id] = {
+                "id": trigger_id, "type": trigger_type, "status": KiteConnect.GTT_STATUS_ACTIVE,
+                "condition": {"exchange": exchange, "tradingsymbol": tradingsymbol,
+                              "trigger_values": list(trigger_values), "last_price": last_price},
+                "orders": [dict(o, exchange=exchange, tradingsymbol=tradingsymbol, result=None)
+                           for o in orders],
+            }
+        return {"trigger_id": trigger_id}
+
+    def get_gtt(self, trigger_id):
+        with self._lock:
+            gtt = self._gtts[trigger_id]
+            if gtt["status"] != KiteConnect.GTT_STATUS_ACTIVE:
+                return gtt
+        cond = gtt["condition"]
+        ltp  = self._ltp(cond["exchange"], cond["tradingsymbol"])
+        low, high = sorted(cond["trigger_values"])
+        hit = None
+        if ltp <= low:
+            hit = cond["trigger_values"].index(low)
+        elif len(cond["trigger_values"]) == 2 and ltp >= high:
+            hit = cond["trigger_values"].index(high)
+        if hit is not None:
+            leg = gtt["orders"][hit]
+            # The leg's own order, so a LIMIT rests if the price gapped through it
+            order_id = self.place_order(
+                KiteConnect.VARIETY_REGULAR, cond["exchange"], cond["tradingsymbol"],
+                leg["transaction_type"], leg["quantity"], leg["product"],
+                leg["order_type"], price=leg.get("price"),
+            )
+            with self._lock:
+                leg["result"] = {"order_result": {"order_id": order_id, "status": "success"}}
+                gtt["status"] = KiteConnect.GTT_STATUS_TRIGGERED
+        return gtt
+
+    def delete_gtt(self, trigger_id):
+        with self._lock:
+            gtt = self._gtts[trigger_id]
+            if gtt["status"] == KiteConnect.GTT_STATUS_ACTIVE:
+                gtt["status"] = KiteConnect.GTT_STATUS_DELETED
+        return {"trigger_id": trigger_id}
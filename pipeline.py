@@ -0,0 +1,133 @@
+# pipeline.py
+import queue
+import threading
+import time
+from collections import deque
+
+BLOCK       = "block"        # full queue blocks the producer (backpressure)
+DROP_OLDEST = "drop_oldest"  # full queue discards its oldest item; producer never waits
+
+_STOP        = object()
+STATS_WINDOW = 1024
+
+
+class Stage:
+    """One pipeline step: a bounded queue drained by its own worker thread.
+
+    `handler(event)` returns an iterable of events for the downstream stages,
+    or None. process() runs the handler inline, so a stage can be driven
+    synchronously without starting its thread.
+    """
+
+    def __init__(self, name, handler, maxsize=256, policy=BLOCK, on_error=None):
+        self.name       = name
+        self.handler    = handler
+        self.policy     = policy
+        self.on_error   = on_error
+        self.queue      = queue.Queue(maxsize=maxsize)
+        self.downstream = []
+        self.processed  = 0
+        self.dropped    = 0
+        self._waits     = deque(maxlen=STATS_WINDOW)
+        self._service   = deque(maxlen=STATS_WINDOW)
+        self._thread    = None
+
+    def connect(self, stage):
+        self.downstream.append(stage)
+        return stage
+
+    # ── Producer side ──
+    def put(self, event):
+        entry = (time.perf_counter(), event)
+        if self.policy == BLOCK:
+            self.queue.put(entry)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(entry)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def emit(self, event):
+        for stage in self.downstream:
+            stage.put(event)
+
+    # ── Consumer side ──
+    def process(self, event):
+        out = self.handler(event)
+        if out is not None:
+            for item in out:
+                self.emit(item)
+
+    def _run(self):
+        while True:
+            enqueued, event = self.queue.get()
+            if event is _STOP:
+                break
+            start = time.perf_counter()
+            self._waits.append(start - enqueued)
+            try:
+                self.process(event)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(self, e)
+                else:
+                    print(f"[{self.name}] {e}")
+            self._service.append(time.perf_counter() - start)
+            self.processed += 1
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        # The sentinel queues behind pending events, so those are handled first
+        if self._thread is not None:
+            self.queue.put((0.0, _STOP))
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        waits   = sorted(self._waits)
+        service = list(self._service)
+        return {
+            "queued":         self.queue.qsize(),
+            "capacity":       self.queue.maxsize,
+            "processed":      self.processed,
+            "dropped":        self.dropped,
+            "wait_ms_p50":    round(waits[len(waits) // 2] * 1000, 3) if waits else None,
+            "wait_ms_p99":    round(waits[int(len(waits) * 0.99)] * 1000, 3) if waits else None,
+            "service_ms_avg": round(sum(service) / len(service) * 1000, 3) if service else None,
+        }
+
+
+class Pipeline:
+    """Stages wired head → tail; started together, stopped in order so queued events drain."""
+
+    def __init__(self, *stages):
+        self.stages = list(stages)
+        for upstream, downstream in zip(self.stages, self.stages[1:]):
+            upstream.connect(downstream)
+
+    @property
+    def head(self):
+        return self.stages[0]
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
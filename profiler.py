@@ -0,0 +1,225 @@
+# profiler.py
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import pytz
+
+IST = pytz.timezone("Asia/Kolkata")
+
+PROFILE_DIR      = os.getenv("PROFILE_DIR", "profiles")
+DEFAULT_INTERVAL = 0.01      # 100 Hz stack sampling
+MIN_INTERVAL     = 0.001     # below this the sampler would busy-loop
+MAX_SAMPLES      = 200_000
+MAX_SPANS        = 200_000
+MAX_DEPTH        = 64
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Span:
+    __slots__ = ("spans", "name", "args", "start")
+
+    def __init__(self, spans, name, args):
+        self.spans = spans
+        self.name  = name
+        self.args  = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.spans.append((self.name, threading.get_ident(), self.start, time.perf_counter(), self.args))
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """Opt-in sampling profiler plus per-phase spans.
+
+    While disabled, span() hands back a shared no-op context manager, so the
+    instrumented loop pays one attribute check per phase.
+    """
+
+    def __init__(self):
+        self.enabled  = False
+        self.interval = DEFAULT_INTERVAL
+        self.samples  = deque(maxlen=MAX_SAMPLES)
+        self.spans    = deque(maxlen=MAX_SPANS)
+        self._thread  = None
+        self._stop    = threading.Event()
+        self._labels  = {}
+        # perf_counter() + offset == epoch seconds
+        self._offset  = time.time() - time.perf_counter()
+
+    # ── Control ──
+    def start(self, interval: float = None):
+        if interval is not None and not interval >= MIN_INTERVAL:
+            raise ValueError(f"Sampling interval must be at least {MIN_INTERVAL * 1000:g} ms.")
+        if self.enabled:
+            return
+        self.interval = interval or DEFAULT_INTERVAL
+        self._stop.clear()
+        self.enabled = True
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.enabled = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def status(self):
+        return {
+            "enabled":     self.enabled,
+            "interval_ms": self.interval * 1000,
+            "samples":     len(self.samples),
+            "spans":       len(self.spans),
+        }
+
+    # ── Instrumentation ──
+    def span(self, name: str, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self.spans, name, args)
+
+    # ── Sampler ──
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = f"{module}.{code.co_name}"
+            self._labels[code] = label
+        return label
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.append((now, ident, tuple(stack)))
+
+    # ── Export ──
+    def _window(self, records, since, until, at=0):
+        # `at` is the index of the perf_counter timestamp inside each record
+        lo = (since - self._offset) if since else float("-inf")
+        hi = (until - self._offset) if until else float("inf")
+        return [r for r in list(records) if lo <= r[at] <= hi]
+
+    def _select(self, since, until, user):
+        spans   = self._window(self.spans, since, until, at=2)
+        samples = self._window(self.samples, since, until)
+        if user is None:
+            return spans, samples
+        # Samples carry no account, so keep those taken on a thread while it
+        # was inside one of the user's spans
+        spans = [s for s in spans if s[4].get("user") == user]
+        busy  = {}
+        for _, ident, start, end, _ in sorted(spans, key=lambda s: s[2]):
+            intervals = busy.setdefault(ident, [])
+            if intervals and start <= intervals[-1][1]:
+                intervals[-1][1] = max(intervals[-1][1], end)
+            else:
+                intervals.append([start, end])
+        starts = {ident: [i[0] for i in intervals] for ident, intervals in busy.items()}
+
+        def owned(ts, ident):
+            n = bisect.bisect_right(starts.get(ident, ()), ts) - 1
+            return n >= 0 and ts <= busy[ident][n][1]
+
+        return spans, [s for s in samples if owned(s[0], s[1])]
+
+    def collapsed(self, since: float = None, until: float = None, user: str = None):
+        """Folded stacks (`thread;frame;frame count`) for flamegraph.pl / speedscope."""
+        names  = thread_names()
+        counts = {}
+        for _, ident, stack in self._select(since, until, user)[1]:
+            key = ";".join((names.get(ident, str(ident)),) + stack)
+            counts[key] = counts.get(key, 0) + 1
+        return "\n".join(f"{key} {n}" for key, n in sorted(counts.items()))
+
+    def chrome_trace(self, since: float = None, until: float = None, user: str = None):
+        """Trace Event Format: spans as complete events, samples with stack frames.
+        With `user`, only that account's spans and the samples taken inside them."""
+        spans, samples = self._select(since, until, user)
+        names  = thread_names()
+        if user is not None:
+            seen  = {s[1] for s in spans}
+            names = {ident: name for ident, name in names.items() if ident in seen}
+        pid    = os.getpid()
+        events = [
+            {"ph": "M", "name": "thread_name", "pid": pid, "tid": ident, "args": {"name": name}}
+            for ident, name in names.items()
+        ]
+
+        for name, ident, start, end, args in spans:
+            events.append({
+                "ph": "X", "name": name, "cat": "engine", "pid": pid, "tid": ident,
+                "ts": (start + self._offset) * 1e6, "dur": (end - start) * 1e6, "args": args,
+            })
+
+        frames, frame_ids = {}, {}
+        for ts, ident, stack in samples:
+            parent = None
+            for label in stack:
+                key = (parent, label)
+                fid = frame_ids.get(key)
+                if fid is None:
+                    fid = len(frame_ids) + 1
+                    frame_ids[key] = fid
+                    frames[str(fid)] = {"name": label, "category": "py"}
+                    if parent is not None:
+                        frames[str(fid)]["parent"] = str(parent)
+                parent = fid
+            if parent is not None:
+                events.append({
+                    "ph": "i", "s": "t", "name": "sample", "pid": pid, "tid": ident,
+                    "ts": (ts + self._offset) * 1e6, "sf": str(parent),
+                })
+
+        return {"traceEvents": events, "stackFrames": frames, "displayTimeUnit": "ms"}
+
+    def export(self, since: float = None, until: float = None, directory: str = PROFILE_DIR,
+               user: str = None):
+        os.makedirs(directory, exist_ok=True)
+        stamp  = datetime.now(IST).strftime("%Y%m%d-%H%M%S")
+        if user is not None:
+            stamp = f"{user}-{stamp}"
+        folded = os.path.join(directory, f"profile-{stamp}.folded")
+        trace  = os.path.join(directory, f"profile-{stamp}.trace.json")
+        with open(folded, "w") as f:
+            f.write(self.collapsed(since, until, user))
+        with open(trace, "w") as f:
+            json.dump(self.chrome_trace(since, until, user), f)
+        return {"folded": os.path.abspath(folded), "chrome": os.path.abspath(trace)}
+
+
+def thread_names():
+    return {t.ident: t.name for t in threading.enumerate()}
+
+
+profiler = Profiler()
@@ -0,0 +1,59 @@
+# scheduler.py
+import os
+import time
+import threading
+from datetime import datetime
+import pytz
+import schedule
+
+from auto_login import ensure_kite, auto_login_configured, USER_ID
+from zerodha_client import all_clients, warm_up
+
+IST = pytz.timezone("Asia/Kolkata")
+
+# Daily pre-market jobs (IST): TOTP login well before the open, then a warm-up
+# call just before 09:15 so the first trading request reuses an open connection.
+AUTO_LOGIN_AT = os.getenv("AUTO_LOGIN_AT", "08:45")
+WARM_UP_AT    = os.getenv("WARM_UP_AT",    "09:14:30")
+
+
+def is_weekday():
+    return datetime.now(IST).weekday() < 5
+
+
+def run_auto_login(on_login=None, force=False):
+    if not (force or is_weekday()):
+        return
+    try:
+        kite = ensure_kite()
+        print(f"[SCHEDULER] Pre-market login ok for {USER_ID}")
+        if on_login is not None:
+            on_login(USER_ID, kite.access_token)
+    except Exception as e:
+        print(f"[SCHEDULER] Pre-market login failed: {e}")
+
+
+def run_warm_up():
+    if not is_weekday():
+        return
+    for user_id, kite in all_clients().items():
+        if kite.access_token and warm_up(kite):
+            print(f"[SCHEDULER] Connection warmed for {user_id}")
+
+
+def start_scheduler(on_login=None, check_now=True):
+    if auto_login_configured():
+        schedule.every().day.at(AUTO_LOGIN_AT, IST).do(run_auto_login, on_login)
+    if auto_login_configured() and check_now:
+        # Startup check: reuse today's token if still valid, else log in now
+        threading.Thread(target=run_auto_login, args=(on_login, True), daemon=True).start()
+    schedule.every().day.at(WARM_UP_AT, IST).do(run_warm_up)
+
+    def loop():
+        while True:
+            schedule.run_pending()
+            time.sleep(1)
+
+    thread = threading.Thread(target=loop, name="scheduler", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,160 @@
+# sessions.py
+import os
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import Stage, DROP_OLDEST
+from datetime import datetime
+import pytz
+
+IST = pytz.timezone("Asia/Kolkata")
+
+SESSION_COOKIE = "algo_session"
+MAX_SESSIONS   = int(os.getenv("MAX_SESSIONS", "32"))
+MAX_LOGS       = 500
+LOOP_WINDOW    = 1024   # feed iterations kept for loop-latency stats
+LOOP_WARMUP    = 3      # first iterations of a run (cold caches, rate limiters) left out of them
+
+log_sink = Stage("log", print, maxsize=10_000, policy=DROP_OLDEST)
+
+
+def new_run_state(underlying: str = None):
+    return {
+        "running": False, "underlying": underlying, "exchange": None,
+        "call_entry": None, "put_entry": None,
+        "call_symbol": None, "put_symbol": None, "qty": None, "lot_size": None,
+        "profit_points": None, "stoploss_points": None,
+        "expiry": None, "pnl": 0.0, "dry_run": True,
+    }
+
+
+def new_state():
+    return {
+        "logs": [], "access_token": None,
+        "logged_in": False, "user_name": None, "user_id": None,
+    }
+
+
+class Run:
+    """One strategy on one underlying, e.g. SENSEX on BFO, inside a session."""
+
+    def __init__(self, session, underlying: str):
+        self.session    = session
+        self.underlying = underlying
+        self.state      = new_run_state(underlying)
+        self.stop_flag  = threading.Event()
+        self.future     = None
+        self.pipeline   = None
+        self.loop_ms    = deque(maxlen=LOOP_WINDOW)
+        self.work_ms    = deque(maxlen=LOOP_WINDOW)   # loop_ms minus rate-limit waits
+        self.iterations = 0
+
+    def log(self, msg: str):
+        self.session.log(f"[{self.underlying}] {msg}")
+
+    def record_loop(self, ms: float, throttled_ms: float = 0.0):
+        self.iterations += 1
+        if self.iterations > LOOP_WARMUP:
+            self.loop_ms.append(ms)
+            self.work_ms.append(ms - throttled_ms)
+
+    def finish(self):
+        self.state["running"] = False
+
+
+class Session:
+    """One logged-in Zerodha account: its token, logs and a run per underlying."""
+
+    def __init__(self, sid: str):
+        self.sid   = sid
+        self.state = new_state()
+        self.runs  = {}   # underlying → Run, most recently started last
+        self.lock  = threading.Lock()
+
+    def log(self, msg: str):
+        timestamp = datetime.now(IST).strftime("%d-%m-%Y %H:%M:%S")
+        entry = f"[{timestamp}] {msg}"
+        logs = self.state["logs"]
+        logs.append(entry)
+        if len(logs) > MAX_LOGS:
+            del logs[:len(logs) - MAX_LOGS]
+        # Console output goes through a dropping sink so a slow stdout never stalls trading
+        log_sink.put(f"[{self.state['user_id'] or self.sid[:8]}] {entry}")
+
+    @property
+    def running(self):
+        return any(run.state["running"] for run in list(self.runs.values()))
+
+    @property
+    def pnl(self):
+        return sum(run.state["pnl"] for run in list(self.runs.values()))
+
+    def new_run(self, underlying: str):
+        # A restart replaces the Run object, so the old run's thread can only
+        # ever finish itself
+        if not self.running:
+            self.state["logs"] = []
+            self.runs.clear()
+        self.runs.pop(underlying, None)
+        run = self.runs[underlying] = Run(self, underlying)
+        return run
+
+    def stop(self, underlying: str = None):
+        for run in list(self.runs.values()):
+            if underlying is None or run.underlying == underlying:
+                run.stop_flag.set()
+                run.state["running"] = False
+
+
+# ── Registry ──
+_sessions: dict = {}
+_registry_lock  = threading.Lock()
+
+# Every run, across sessions and underlyings, is scheduled on this shared pool
+pool = ThreadPoolExecutor(max_workers=MAX_SESSIONS, thread_name_prefix="algo")
+_in_flight = set()   # futures still holding a worker, including runs stopped but not yet returned
+
+
+def get_session(sid: str):
+    if not sid:
+        return None
+    return _sessions.get(sid)
+
+
+def all_sessions():
+    return list(_sessions.values())
+
+
+def session_for_user(user_id: str, sid: str = None):
+    # Re-logging into the same account must reuse its session, never run it twice
+    with _registry_lock:
+        for session in list(_sessions.values()):
+            if session.state["user_id"] == user_id:
+                # The API may have restarted and issued a new id for this account
+                if sid and session.sid != sid:
+                    del _sessions[session.sid]
+                    session.sid = sid
+                    _sessions[sid] = session
+                return session
+        session = Session(sid or secrets.token_urlsafe(24))
+        session.state["user_id"] = user_id
+        _sessions[session.sid] = session
+        return session
+
+
+def drop_session(sid: str):
+    with _registry_lock:
+        return _sessions.pop(sid, None)
+
+
+def submit(run: Run, fn, *args):
+    # Count busy workers, not runs flagged running: a stopped run keeps its
+    # worker until its loop returns, and a start past capacity would queue silently
+    with _registry_lock:
+        if len(_in_flight) >= MAX_SESSIONS:
+            raise RuntimeError(f"Engine capacity reached ({MAX_SESSIONS} strategies).")
+        run.future = pool.submit(fn, run, *args)
+        _in_flight.add(run.future)
+    run.future.add_done_callback(_in_flight.discard)
+    return run.future
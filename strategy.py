@@ -1,16 +1,18 @@
 import math
+import numpy as np
 
 def bullish_crossover(df):
+    # Works on a DataFrame from add_ema or on CandleBuffer rows (structured array)
     if len(df) < 51:
         return False
 
-    prev = df.iloc[-3]
-    curr = df.iloc[-2]
+    ema20 = np.asarray(df["ema20"])
+    ema50 = np.asarray(df["ema50"])
 
-    ema20_prev = prev["ema20"]
-    ema50_prev = prev["ema50"]
-    ema20_curr = curr["ema20"]
-    ema50_curr = curr["ema50"]
+    ema20_prev = ema20[-3]
+    ema50_prev = ema50[-3]
+    ema20_curr = ema20[-2]
+    ema50_curr = ema50[-2]
 
     if any(map(lambda x: x is None or (isinstance(x, float) and math.isnan(x)),
                [ema20_prev, ema50_prev, ema20_curr, ema50_curr])):
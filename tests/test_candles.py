@@ -0,0 +1,104 @@
+# tests/test_candles.py
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from candles import CandleBuffer, IST
+from indicators import add_ema
+from strategy import bullish_crossover
+
+START = datetime(2026, 10, 19, 9, 15, tzinfo=IST)
+
+
+def history(n, seed=0):
+    # A Kite historical_data list: one-minute bars of a wandering price
+    rng = np.random.default_rng(seed)
+    closes = 100 + np.cumsum(rng.normal(0, 1, n))
+    return [{"date": START + timedelta(minutes=i), "open": c, "high": c + 1, "low": c - 1,
+             "close": float(c), "volume": 10.0}
+            for i, c in enumerate(closes)]
+
+
+def expected(candles):
+    return add_ema(pd.DataFrame(candles))
+
+
+def assert_emas(buf, candles):
+    # The buffer keeps running EMAs, so it matches add_ema over everything it was fed
+    df = expected(candles)
+    n = len(buf)
+    assert np.allclose(buf["close"], df["close"].to_numpy()[-n:])
+    assert np.allclose(buf["ema20"], df["ema20"].to_numpy()[-n:])
+    assert np.allclose(buf["ema50"], df["ema50"].to_numpy()[-n:])
+
+
+def test_initial_merge_matches_add_ema():
+    candles = history(120)
+    buf = CandleBuffer(capacity=200)
+    assert buf.merge(candles) == 120
+    assert_emas(buf, candles)
+    assert bullish_crossover(buf.tail(60)) == bullish_crossover(expected(candles))
+
+
+def test_initial_merge_keeps_last_capacity_bars():
+    candles = history(300)
+    buf = CandleBuffer(capacity=64)
+    assert buf.merge(candles) == 64
+    assert buf.last_ts == int(candles[-1]["date"].timestamp())
+    # EMAs start at the first bar kept
+    assert_emas(buf, candles[-64:])
+
+
+def test_incremental_merges_and_compaction_match_add_ema():
+    candles = history(400)
+    buf = CandleBuffer(capacity=64)
+    buf.merge(candles[:100])
+    fed_from = 100 - 64
+    # Each poll returns the whole day so far, as Kite does; 300 more bars
+    # wrap the 128-row array more than once
+    for end in range(103, 401, 3):
+        assert buf.merge(candles[:end]) == 3
+        assert len(buf) == 64
+        assert_emas(buf, candles[fed_from:end])
+
+
+def test_forming_bar_is_updated_in_place():
+    candles = history(80)
+    buf = CandleBuffer(capacity=128)
+    buf.merge(candles)
+
+    forming = dict(candles[-1], close=candles[-1]["close"] + 5, high=candles[-1]["high"] + 5)
+    candles = candles[:-1] + [forming]
+    assert buf.merge(candles) == 0
+    assert len(buf) == 80
+    assert math.isclose(buf[-1].close, forming["close"])
+    assert_emas(buf, candles)
+
+
+def test_older_bar_is_ignored():
+    candles = history(60)
+    buf = CandleBuffer(capacity=128)
+    buf.merge(candles)
+    before = buf["close"].copy()
+
+    old = candles[10]
+    assert buf.upsert(int(old["date"].timestamp()), 1, 1, 1, 1.0) is False
+    assert len(buf) == 60
+    assert np.array_equal(buf["close"], before)
+    assert buf.last_ts == int(candles[-1]["date"].timestamp())
+
+
+def test_tail_and_columns_are_views():
+    candles = history(100)
+    buf = CandleBuffer(capacity=64)
+    buf.merge(candles)
+    buf.merge(history(101))   # past the initial rows, so the window is offset
+
+    tail = buf.tail(10)
+    assert len(tail) == 10
+    assert np.shares_memory(tail, buf._data)
+    assert np.shares_memory(buf["close"], buf._data)
+    assert tail["ts"][-1] == buf.last_ts
+    assert len(buf.tail(1000)) == len(buf)
@@ -0,0 +1,79 @@
+# tests/test_data.py
+import threading
+import time
+
+import pytest
+
+import data
+
+
+class SlowQuotes:
+    """ltp() that blocks until released, like a throttled round trip."""
+
+    def __init__(self):
+        self.calls   = 0
+        self.release = threading.Event()
+        self.price   = 100.0
+
+    def ltp(self, *instruments):
+        self.calls += 1
+        self.release.wait(5)
+        return {k: {"last_price": self.price} for k in instruments}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(data, "_ltp", {})
+    monkeypatch.setattr(data, "_watch", {})
+
+
+def test_readers_take_cached_price_during_refresh(monkeypatch):
+    quotes = SlowQuotes()
+    quotes.release.set()
+    assert data.get_ltp(quotes, "NFO", "A") == 100.0
+
+    # Expire the cache and hold the next refresh open
+    monkeypatch.setattr(data, "LTP_TTL", 0)
+    quotes.release.clear()
+    quotes.price = 101.0
+    refresher = threading.Thread(target=data.get_ltp, args=(quotes, "NFO", "A"))
+    refresher.start()
+    while quotes.calls < 2:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    assert data.get_ltp(quotes, "NFO", "A") == 100.0
+    assert time.monotonic() - started < 0.5
+    assert quotes.calls == 2
+
+    quotes.release.set()
+    refresher.join()
+    assert data._ltp["NFO:A"][1] == 101.0
+
+
+def test_concurrent_first_reads_share_one_call():
+    quotes = SlowQuotes()
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(data.get_ltp(quotes, "NFO", "A")))
+               for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    time.sleep(0.1)
+    quotes.release.set()
+    for reader in readers:
+        reader.join()
+    assert results == [100.0] * 4
+    assert quotes.calls == 1
+
+
+def test_ttl_cache_serves_stale_value_while_fetching():
+    cache, release = data.TTLCache(ttl=0), threading.Event()
+    assert cache.get("k", lambda: 1) == 1
+
+    slow = threading.Thread(target=cache.get, args=("k", lambda: release.wait(5) and 2))
+    slow.start()
+    time.sleep(0.05)
+    assert cache.get("k", lambda: 3) == 1
+    release.set()
+    slow.join()
+    assert cache._data["k"][1] == 2
@@ -0,0 +1,25 @@
+# tests/test_engine.py
+import pytest
+
+import engine
+import sessions
+
+
+def test_authkey_requires_secret(monkeypatch):
+    monkeypatch.delenv("API_SECRET", raising=False)
+    with pytest.raises(RuntimeError):
+        engine.engine_authkey()
+
+    monkeypatch.setenv("API_SECRET", "one")
+    key = engine.engine_authkey()
+    monkeypatch.setenv("API_SECRET", "two")
+    assert engine.engine_authkey() != key
+
+
+def test_sessions_reply_has_no_access_token(monkeypatch):
+    monkeypatch.setattr(sessions, "_sessions", {})
+    session = sessions.session_for_user("AB1234")
+    session.state.update(user_name="Test", access_token="secret-token", logged_in=True)
+
+    (info,) = engine.cmd_sessions()
+    assert info == {"sid": session.sid, "user_id": "AB1234", "user_name": "Test", "logged_in": True}
@@ -0,0 +1,319 @@
+# tests/test_exits.py
+import time
+from types import SimpleNamespace
+
+import pytest
+from kiteconnect import KiteConnect
+from kiteconnect.exceptions import InputException
+
+import data
+import engine
+import exits as exits_module
+from exits import ExchangeExits, MAX_REARMS
+from paper_broker import PaperBroker
+from sessions import Session, Run
+
+EXCHANGE, SYMBOL, QTY = "NFO", "NIFTY25O2325000CE", 75
+KEY = f"{EXCHANGE}:{SYMBOL}"
+MIS, NRML = KiteConnect.PRODUCT_MIS, KiteConnect.PRODUCT_NRML
+
+
+class Market(KiteConnect):
+    """Market data only, at whatever price the test sets."""
+
+    def __init__(self):
+        super().__init__(api_key="test")
+        self.prices = {KEY: 100.0}
+
+    def ltp(self, *instruments):
+        return {k: {"instrument_token": 0, "last_price": self.prices[k]} for k in instruments}
+
+
+@pytest.fixture
+def market(monkeypatch):
+    # Every read goes to the market, so a price change is seen on the next poll
+    monkeypatch.setattr(data, "LTP_TTL", 0)
+    monkeypatch.setattr(data, "_ltp", {})
+    monkeypatch.setattr(data, "_watch", {})
+    return Market()
+
+
+@pytest.fixture
+def broker(market):
+    return PaperBroker(market)
+
+
+def trade(broker, side, product):
+    order_id = broker.place_order(
+        variety=broker.VARIETY_REGULAR, exchange=EXCHANGE, tradingsymbol=SYMBOL,
+        transaction_type=side, quantity=QTY, product=product, order_type=broker.ORDER_TYPE_MARKET,
+    )
+    return broker.order_history(order_id)[-1]
+
+
+def arm(broker, mode, entry=100.0):
+    # Target 120, stoploss 90
+    return ExchangeExits(broker, mode, EXCHANGE, SYMBOL, QTY, entry, 20, 10).place(100.0)
+
+
+def status(broker, order_id):
+    return broker.order_history(order_id)[-1]["status"]
+
+
+# ── Exchange mode (SL-M + target LIMIT) ──
+def test_target_fill_cancels_stoploss(market, broker):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, MIS)
+    exits = arm(broker, "exchange")
+    sl_id = exits.sl_order_id
+    assert exits.poll() is None
+
+    market.prices[KEY] = 121.0
+    assert exits.poll() == ("TARGET", 121.0)
+    assert status(broker, sl_id) == KiteConnect.STATUS_CANCELLED
+    assert not exits.is_active()
+
+
+def test_stoploss_fill_cancels_target(market, broker):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, MIS)
+    exits = arm(broker, "exchange")
+    target_id = exits.target_order_id
+
+    market.prices[KEY] = 85.0
+    assert exits.poll() == ("STOPLOSS", 85.0)
+    assert status(broker, target_id) == KiteConnect.STATUS_CANCELLED
+    assert not exits.is_active()
+
+
+def test_both_legs_filled_buys_back_the_oversell(market, broker):
+    # A second long lets the paper broker fill both sells, as a whipsaw can live
+    trade(broker, broker.TRANSACTION_TYPE_BUY, MIS)
+    trade(broker, broker.TRANSACTION_TYPE_BUY, MIS)
+    exits = arm(broker, "exchange")
+    market.prices[KEY] = 85.0
+    broker.orders()
+    market.prices[KEY] = 121.0
+    broker.orders()
+
+    assert exits.poll() == ("STOPLOSS", 85.0)
+    assert "both exit orders executed" in exits.alert
+    buys = [o for o in broker.orders() if o["transaction_type"] == broker.TRANSACTION_TYPE_BUY]
+    assert [(o["quantity"], o["status"]) for o in buys] == [(QTY, KiteConnect.STATUS_COMPLETE)] * 3
+    # Only the second long is left
+    assert broker._position(EXCHANGE, SYMBOL, MIS) == QTY
+
+
+def test_external_cancel_is_rearmed_up_to_limit(market, broker):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, MIS)
+    exits = arm(broker, "exchange")
+
+    for _ in range(MAX_REARMS):
+        cancelled = exits.sl_order_id
+        broker.cancel_order(variety=broker.VARIETY_REGULAR, order_id=cancelled)
+        assert exits.poll() is None
+        assert exits.sl_order_id != cancelled
+        assert status(broker, exits.sl_order_id) == "TRIGGER PENDING"
+        assert exits.failed is None
+
+    target_id = exits.target_order_id
+    broker.cancel_order(variety=broker.VARIETY_REGULAR, order_id=exits.sl_order_id)
+    assert exits.poll() is None
+    assert "cancelled" in exits.failed
+    assert status(broker, target_id) == KiteConnect.STATUS_CANCELLED
+    assert not exits.is_active()
+
+
+def test_rejected_exit_is_not_placed_again(market, broker):
+    # No position to sell: the exchange rejects both legs
+    exits = arm(broker, "exchange")
+    for _ in range(3):
+        assert exits.poll() is None
+    assert "rejected" in exits.failed
+    assert len(broker.orders()) == 2
+    assert not exits.is_active()
+
+
+# ── GTT mode ──
+def test_gtt_books_executed_price(market, broker):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, NRML)
+    exits = arm(broker, "gtt")
+    assert exits.poll() is None
+
+    # Through the 90 trigger but above the 85.5 limit; the sell executes at 88
+    market.prices[KEY] = 88.0
+    assert exits.poll() == ("STOPLOSS", 88.0)
+    assert not exits.is_active()
+    sells = [o for o in broker.orders() if o["transaction_type"] == broker.TRANSACTION_TYPE_SELL]
+    assert [(o["product"], o["order_type"], o["price"]) for o in sells] == [(NRML, broker.ORDER_TYPE_LIMIT, 85.5)]
+
+
+def test_gtt_gap_through_limit_goes_market(market, broker, monkeypatch):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, NRML)
+    exits = arm(broker, "gtt")
+    market.prices[KEY] = 80.0
+    assert exits.poll() is None
+    order_id, _ = exits.gtt_order
+    assert status(broker, order_id) == "OPEN"
+
+    monkeypatch.setattr(exits_module, "GTT_FILL_TIMEOUT", 0)
+    assert exits.poll() is None
+    assert exits.poll() == ("STOPLOSS", 80.0)
+    assert not exits.is_active()
+
+
+def test_cancel_withdraws_triggered_gtt_order(market, broker):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, NRML)
+    exits = arm(broker, "gtt")
+    market.prices[KEY] = 80.0
+    assert exits.poll() is None
+    order_id, _ = exits.gtt_order
+
+    exits.cancel()
+    assert status(broker, order_id) == KiteConnect.STATUS_CANCELLED
+    assert not exits.is_active()
+
+
+def test_gtt_target(market, broker):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, NRML)
+    exits = arm(broker, "gtt")
+    market.prices[KEY] = 125.0
+    assert exits.poll() == ("TARGET", 125.0)
+
+
+def test_gtt_refused_against_mis_entry(market, broker):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, MIS)
+    with pytest.raises(InputException):
+        arm(broker, "gtt")
+
+
+def test_triggered_gtt_with_rejected_order_is_not_booked(market, broker):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, NRML)
+    exits = arm(broker, "gtt")
+    # Position closed elsewhere, so the triggered sell is rejected
+    trade(broker, broker.TRANSACTION_TYPE_SELL, NRML)
+
+    market.prices[KEY] = 80.0
+    assert exits.poll() is None
+    assert "rejected" in exits.failed
+    assert exits.poll() is None
+    assert not exits.is_active()
+
+
+def test_deleted_gtt_fails(market, broker):
+    trade(broker, broker.TRANSACTION_TYPE_BUY, NRML)
+    exits = arm(broker, "gtt")
+    broker.delete_gtt(exits.gtt_id)
+    assert exits.poll() is None
+    assert exits.failed == f"GTT {KiteConnect.GTT_STATUS_DELETED}"
+
+
+# ── Engine wiring ──
+class TargetFails(PaperBroker):
+    def place_order(self, order_type, **kwargs):
+        if order_type == self.ORDER_TYPE_LIMIT:
+            raise InputException("Target price out of range")
+        return super().place_order(order_type=order_type, **kwargs)
+
+
+class BuyRaises(PaperBroker):
+    def place_order(self, transaction_type, **kwargs):
+        if transaction_type == self.TRANSACTION_TYPE_BUY:
+            raise InputException("Insufficient funds")
+        return super().place_order(transaction_type=transaction_type, **kwargs)
+
+
+class BuyRejected(PaperBroker):
+    def order_history(self, order_id):
+        return [dict(o, status=self.STATUS_REJECTED, status_message="Insufficient funds")
+                for o in super().order_history(order_id)]
+
+
+def new_run():
+    run = Run(Session("test"), "NIFTY")
+    run.state["dry_run"] = True
+    return run
+
+
+def new_leg(product=MIS):
+    return engine.new_leg("CE", {"symbol": SYMBOL, "strike": 25000.0, "exchange": EXCHANGE}, product)
+
+
+def stages(run, market, broker, leg, exit_mode="exchange"):
+    config = SimpleNamespace(exit_mode=exit_mode, profit_points=20, stoploss_points=10)
+    pipeline = engine.build_pipeline(run, market, broker, config, (leg, new_leg()), QTY)
+    return {stage.name: stage for stage in pipeline.stages}
+
+
+def execution_stage(run, market, broker, leg, exit_mode="exchange"):
+    return stages(run, market, broker, leg, exit_mode)["execution"]
+
+
+def test_arm_failure_cancels_placed_stoploss(market):
+    broker = TargetFails(market)
+    trade(broker, broker.TRANSACTION_TYPE_BUY, MIS)
+    leg = new_leg()
+    leg["entry"] = 100.0
+
+    engine.arm_exits(new_run(), market, broker, leg, QTY, SimpleNamespace(
+        exit_mode="exchange", profit_points=20, stoploss_points=10))
+    assert leg["exits"] is None
+    sl = [o for o in broker.orders() if o["order_type"] == broker.ORDER_TYPE_SLM]
+    assert [o["status"] for o in sl] == [KiteConnect.STATUS_CANCELLED]
+
+
+@pytest.fixture
+def fills(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(engine.journal, "fill", lambda *row: recorded.append(row) or (time.time(), 0.0))
+    return recorded
+
+
+@pytest.mark.parametrize("broker_class", [BuyRaises, BuyRejected])
+def test_failed_entry_arms_no_exits(market, fills, broker_class):
+    broker, leg = broker_class(market), new_leg()
+    execution_stage(new_run(), market, broker, leg).process(("enter", leg, time.time()))
+    assert fills == []
+    assert leg["entry"] is None
+    assert leg["exits"] is None
+    assert not [o for o in broker.orders() if o["transaction_type"] == broker.TRANSACTION_TYPE_SELL]
+
+
+def test_no_entry_after_stop(market, broker, fills):
+    run, leg = new_run(), new_leg()
+    run.stop_flag.set()
+    execution_stage(run, market, broker, leg).process(("enter", leg, time.time()))
+    assert fills == []
+    assert leg["entry"] is None
+    assert broker.orders() == []
+
+
+def test_filled_entry_uses_average_price(market, broker, fills):
+    leg, signal_ts = new_leg(), time.time()
+    execution_stage(new_run(), market, broker, leg).process(("enter", leg, signal_ts))
+    # Journalled at the fill price, timed from the strategy's signal
+    (fill,) = fills
+    assert (fill[6], fill[8]) == (100.0, signal_ts)
+    # Exits are set from the fill price, not the signalled close
+    assert leg["entry"] == 100.0
+    assert (leg["exits"].stoploss, leg["exits"].target) == (90.0, 120.0)
+
+
+def test_gtt_mode_enters_nrml(market, broker):
+    leg = new_leg(product=engine.entry_product("gtt"))
+    execution_stage(new_run(), market, broker, leg, exit_mode="gtt").process(("enter", leg, time.time()))
+    assert leg["exits"] is not None and leg["exits"].gtt_id is not None
+    buys = [o for o in broker.orders() if o["transaction_type"] == broker.TRANSACTION_TYPE_BUY]
+    assert [o["product"] for o in buys] == [NRML]
+
+
+def test_polled_exit_books_fill_price(market, broker, fills):
+    leg = new_leg()
+    stage = stages(new_run(), market, broker, leg, exit_mode="poll")
+    stage["execution"].process(("enter", leg, time.time()))
+
+    market.prices[KEY] = 125.0
+    (intent,) = stage["strategy"].handler(("tick", leg, 121.0))
+    stage["execution"].process(intent)
+    # Signalled at 121, sold at the 125 the order actually got
+    _, exit_fill = fills
+    assert (exit_fill[6], exit_fill[7], exit_fill[8]) == (125.0, "TARGET", intent[3])
+    assert leg["entry"] is None
@@ -0,0 +1,129 @@
+# tests/test_journal.py
+import json
+
+import journal
+from journal import Journal, connect, read_aggregates, refresh_aggregates, aggregate_groups, summarize, COLUMNS
+
+USER = "AB1234"
+
+
+def trade_row(pnl, exit_ts, user_id=USER, strike=25000.0, day="2026-10-19", strategy="EMA:NIFTY",
+              entry_latency_ms=None, exit_latency_ms=None):
+    return {
+        "day": day, "user_id": user_id, "strategy": strategy, "symbol": f"NIFTY{strike:g}CE",
+        "strike": strike, "qty": 75, "entry_ts": exit_ts - 60, "entry_price": 100.0,
+        "exit_ts": exit_ts, "exit_price": 100.0 + pnl / 75, "pnl": pnl, "reason": "TARGET",
+        "entry_latency_ms": entry_latency_ms, "exit_latency_ms": exit_latency_ms,
+    }
+
+
+def insert(conn, *trades):
+    cols = COLUMNS["trades"]
+    with conn:
+        conn.executemany(
+            f"INSERT INTO trades ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+            [tuple(t[c] for c in cols) for t in trades],
+        )
+
+
+# ── summarize ──
+def test_summarize_win_rate_and_drawdown():
+    stats = summarize([trade_row(p, i) for i, p in enumerate((100, -50, -80, 200))])
+    assert stats["trades"] == 4
+    assert stats["win_rate"] == 0.5
+    assert stats["total_pnl"] == 170
+    assert stats["avg_pnl"] == 42.5
+    # Peak 100, trough -30
+    assert stats["max_drawdown"] == 130
+
+
+def test_summarize_latency_skips_missing():
+    stats = summarize([trade_row(10, 1, entry_latency_ms=20.0, exit_latency_ms=None),
+                       trade_row(10, 2, entry_latency_ms=40.0, exit_latency_ms=90.0)])
+    assert stats["avg_latency_ms"] == 50.0
+    assert stats["max_latency_ms"] == 90.0
+
+
+def test_summarize_no_trades():
+    stats = summarize([])
+    assert (stats["trades"], stats["win_rate"], stats["avg_latency_ms"]) == (0, None, None)
+
+
+# ── Writer ──
+class CountingConnection:
+    """Delegates to a real connection, counting executemany() per table."""
+
+    def __init__(self, conn):
+        self.conn  = conn
+        self.calls = []
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        self.calls.append((sql.split()[2], len(rows)))
+        return self.conn.executemany(sql, rows)
+
+
+def test_writes_are_batched_and_flushed_on_close(tmp_path, monkeypatch):
+    path = str(tmp_path / "journal.db")
+    j = Journal(path)
+    j.signal(USER, "EMA:NIFTY", "NIFTY25000CE", 25000, "ENTRY", 100.0)   # not started: dropped
+    writer = CountingConnection(connect(path))
+    monkeypatch.setattr(journal, "connect", lambda path: writer)
+    # Queued ahead of the writer, so it finds full batches waiting
+    n = journal.BATCH_SIZE * 2 + 1
+    for i in range(n):
+        j.queue.put(("signals", (float(i), "2026-10-19", USER, "EMA:NIFTY", "NIFTY25000CE", 25000, "ENTRY", 1.0)))
+    j.start()
+    j.close()
+
+    assert connect(path).execute("SELECT COUNT(*) FROM signals").fetchone() == (n,)
+    # BATCH_SIZE rows per statement, not a statement per row
+    batches = [size for table, size in writer.calls if table == "signals"]
+    assert batches == [journal.BATCH_SIZE, journal.BATCH_SIZE, 1]
+
+
+# ── Aggregates ──
+def test_read_aggregates_scopes(tmp_path):
+    path = str(tmp_path / "journal.db")
+    j = Journal(path)
+    j.start()
+    for row in (trade_row(100, 1), trade_row(-50, 2, strike=25100.0),
+                trade_row(30, 3, user_id="CD5678")):
+        j.trade(**{k: v for k, v in row.items() if k != "day"})
+    j.close()
+
+    aggs = read_aggregates(USER, path)
+    assert list(aggs["daily"]) == [journal.today()]
+    assert aggs["daily"][journal.today()]["total_pnl"] == 50
+    # Keyed by strike, with the engine's float strikes normalised
+    assert aggs["strike"]["25000"]["total_pnl"] == 100
+    assert aggs["strike"]["25100"]["total_pnl"] == -50
+    assert aggs["strategy"]["EMA:NIFTY"]["trades"] == 2
+    assert read_aggregates(USER, str(tmp_path / "missing.db")) == {"daily": {}, "strike": {}, "strategy": {}}
+
+
+def test_refresh_only_rewrites_changed_groups(tmp_path):
+    conn = connect(str(tmp_path / "journal.db"))
+    insert(conn, trade_row(100, 1), trade_row(-50, 2, strike=25100.0))
+    refresh_aggregates(conn)
+    before = dict(conn.execute("SELECT scope || ':' || key, updated FROM aggregates").fetchall())
+
+    new = trade_row(20, 3)
+    insert(conn, new)
+    refresh_aggregates(conn, aggregate_groups(new))
+    after = dict(conn.execute("SELECT scope || ':' || key, updated FROM aggregates").fetchall())
+    data = {k: json.loads(v) for k, v in conn.execute("SELECT scope || ':' || key, data FROM aggregates")}
+
+    assert after["strike:25100"] == before["strike:25100"]
+    assert after["strike:25000"] > before["strike:25000"]
+    assert data["daily:2026-10-19"]["trades"] == 3
+    assert data["strike:25000"]["total_pnl"] == 120
@@ -0,0 +1,47 @@
+# tests/test_profiler.py
+import threading
+
+import pytest
+
+from profiler import Profiler
+
+
+def record(profiler, user, stack):
+    # One span on its own thread, with a sample taken inside it
+    def work():
+        with profiler.span("iteration", user=user, underlying="NIFTY") as span:
+            pass
+        profiler.samples.append(((span.start + profiler.spans[-1][3]) / 2, threading.get_ident(), stack))
+        profiler.samples.append((profiler.spans[-1][3] + 1, threading.get_ident(), ("idle",)))
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+
+
+def test_export_is_scoped_to_user():
+    profiler = Profiler()
+    profiler.enabled = True
+    record(profiler, "AB1234", ("engine.run_feed", "data.get_ltp"))
+    record(profiler, "CD5678", ("engine.run_feed", "exits.poll"))
+
+    trace = profiler.chrome_trace(user="AB1234")
+    spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    assert [e["args"]["user"] for e in spans] == ["AB1234"]
+    samples = [e for e in trace["traceEvents"] if e["ph"] == "i"]
+    assert len(samples) == 1
+    assert {f["name"] for f in trace["stackFrames"].values()} == {"engine.run_feed", "data.get_ltp"}
+
+    folded = profiler.collapsed(user="AB1234")
+    assert "data.get_ltp 1" in folded
+    assert "exits.poll" not in folded and "idle" not in folded
+
+    # Unscoped, everything is kept
+    assert len(profiler.collapsed().splitlines()) == 4
+
+
+@pytest.mark.parametrize("interval", [-1, 0, 0.0001, float("nan")])
+def test_start_rejects_busy_loop_interval(interval):
+    profiler = Profiler()
+    with pytest.raises(ValueError):
+        profiler.start(interval)
+    assert not profiler.enabled
@@ -1,23 +1,199 @@
 # zerodha_client.py
+import time
+import threading
 from kiteconnect import KiteConnect
+from kiteconnect.exceptions import TokenException
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
 
+TOKEN_DIR = os.getenv("TOKEN_DIR", "tokens")
 
-def get_kite(access_token: str = None):
-    kite = KiteConnect(api_key=API_KEY)
+# "fake" swaps in fake_kite.FakeKite (simulated market, no network) for load tests
+KITE_BACKEND = os.getenv("KITE_BACKEND", "live")
 
+# Keep-alive pool shared by every call an account makes (HTTPAdapter kwargs)
+POOL = {
+    "pool_connections": 4,
+    "pool_maxsize":     int(os.getenv("KITE_POOL_SIZE", "8")),
+    "max_retries":      2,
+    "pool_block":       False,
+}
+
+# Kite Connect limits, requests per second per account
+RATE_LIMITS = {
+    "quote":      1,
+    "historical": 3,
+    "order":      10,
+    "default":    10,
+}
+
+_clients: dict = {}
+_clients_lock  = threading.Lock()
+
+
+_throttled = threading.local()
+
+
+def throttled_ms():
+    """Total time this thread has slept in rate limiters, in ms."""
+    return getattr(_throttled, "ms", 0.0)
+
+
+class RateLimiter:
+    """Token bucket: acquire() sleeps just long enough to stay under `rate` per second."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate    = rate
+        self.burst   = burst or rate
+        self._tokens = self.burst
+        self._last   = time.monotonic()
+        self._lock   = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+            _throttled.ms = throttled_ms() + wait * 1000
+
+
+class ThrottledKite(KiteConnect):
+    """KiteConnect whose calls wait on the account's rate limits instead of
+    getting 429s. Every session and strategy on the account shares one."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limits = {name: RateLimiter(rate) for name, rate in RATE_LIMITS.items()}
+
+    def _throttle(self, name):
+        self.limits[name].acquire()
+
+    def ltp(self, *instruments):
+        self._throttle("quote")
+        return super().ltp(*instruments)
+
+    def quote(self, *instruments):
+        self._throttle("quote")
+        return super().quote(*instruments)
+
+    def ohlc(self, *instruments):
+        self._throttle("quote")
+        return super().ohlc(*instruments)
+
+    def historical_data(self, *args, **kwargs):
+        self._throttle("historical")
+        return super().historical_data(*args, **kwargs)
+
+    def place_order(self, *args, **kwargs):
+        self._throttle("order")
+        return super().place_order(*args, **kwargs)
+
+    def modify_order(self, *args, **kwargs):
+        self._throttle("order")
+        return super().modify_order(*args, **kwargs)
+
+    def cancel_order(self, *args, **kwargs):
+        self._throttle("order")
+        return super().cancel_order(*args, **kwargs)
+
+    def orders(self):
+        self._throttle("default")
+        return super().orders()
+
+    def get_gtt(self, *args, **kwargs):
+        self._throttle("default")
+        return super().get_gtt(*args, **kwargs)
+
+    def place_gtt(self, *args, **kwargs):
+        self._throttle("default")
+        return super().place_gtt(*args, **kwargs)
+
+    def delete_gtt(self, *args, **kwargs):
+        self._throttle("default")
+        return super().delete_gtt(*args, **kwargs)
+
+
+def new_client(**kwargs):
+    if KITE_BACKEND == "fake":
+        from fake_kite import FakeKite
+        return FakeKite(api_key=API_KEY, **kwargs)
+    return ThrottledKite(api_key=API_KEY, **kwargs)
+
+
+def token_path(user_id: str = None):
+    # One token file per Zerodha account; legacy single-account file otherwise
+    if not user_id:
+        return "access_token.txt"
+    return os.path.join(TOKEN_DIR, f"{user_id}.txt")
+
+
+def save_access_token(access_token: str, user_id: str = None):
+    path = token_path(user_id)
+    if user_id:
+        os.makedirs(TOKEN_DIR, exist_ok=True)
+    with open(path, "w") as f:
+        f.write(access_token)
+
+
+def load_access_token(user_id: str = None):
+    path = token_path(user_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return f.read().strip() or None
+
+
+def get_kite(access_token: str = None, user_id: str = None):
+    """Return the long-lived client for an account, creating it on first use.
+
+    The client (with its pooled HTTP connections and rate limiters) is reused
+    across calls; a new access token is swapped into the existing client rather
+    than building a new one.
+    """
     # If no token passed, try reading from file
     if not access_token:
-        if os.path.exists("access_token.txt"):
-            with open("access_token.txt", "r") as f:
-                access_token = f.read().strip()
+        access_token = load_access_token(user_id)
+        if access_token:
             print("Access token loaded from file.")
         else:
             raise Exception("No access token found. Run auto_login.py first.")
 
-    kite.set_access_token(access_token)
-    return kite
\ No newline at end of file
+    key = user_id or "default"
+    with _clients_lock:
+        kite = _clients.get(key)
+        if kite is None:
+            kite = new_client(pool=POOL)
+            _clients[key] = kite
+        if kite.access_token != access_token:
+            kite.set_access_token(access_token)
+    return kite
+
+
+def all_clients():
+    with _clients_lock:
+        return dict(_clients)
+
+
+def is_token_valid(kite):
+    try:
+        kite.profile()
+        return True
+    except TokenException:
+        return False
+
+
+def warm_up(kite):
+    # A cheap authenticated call opens the TLS connection and checks the token
+    try:
+        kite.profile()
+        return True
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        return False